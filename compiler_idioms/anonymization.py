@@ -1,11 +1,13 @@
+import functools
+import itertools
 import re
-from dataclasses import dataclass, field
-from typing import List, Tuple, Dict
+from typing import List, Tuple, Dict, NamedTuple, Iterator, Callable, Hashable, Optional, Sequence
 
 from icecream import ic
 
-from compiler_idioms.instruction import Instruction
-from compiler_idioms.registers import INTELx64_REGISTERS
+from compiler_idioms.instruction import Instruction, Interner
+from compiler_idioms.registers import lookup_register
+from config import OPERAND_CACHE_SIZE
 
 MNEMONICS_TO_CONSIDER = {"movsxd": "movsx", "shl": "sal"}
 CONSTANT = 'const_'
@@ -15,8 +17,21 @@ VARIABLE = 'loc'
 CONSTANT_PATTERN = re.compile(r'(-*0x[A-Fa-f\d]+|-*\d+)')  # hex and decimal, positive & negative
 # local variables (byte ptr [ebp-8], qword ptr [esp], ...) and arguments (dword [ebp+8], ...)
 VARIABLE_PATTERN = re.compile(r'((d*q*word|byte|(D*WORD)|BYTE)+\s(ptr|PTR)\s+\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\])')
-# eax, ax, rax, r8 etc.
-REGISTER_PATTERN = re.compile(f'{"|".join(INTELx64_REGISTERS)}')
+# variables, words and constants of an operand in a single scan. Words are registers if lookup_register knows
+# them, i.e. registers are only found as whole words (r8d, not r8). The lookaheads on the first character let the
+# scan skip the long alternatives quickly.
+OPERAND_TOKEN_PATTERN = re.compile(
+    f'(?P<variable>(?=[dqwbDWB]){VARIABLE_PATTERN.pattern})'
+    f'|(?P<register>(?<![a-z0-9])[a-z][a-z0-9]*)'
+    f'|(?P<constant>{CONSTANT_PATTERN.pattern})'
+)
+# kind of anonymized name of the groups of OPERAND_TOKEN_PATTERN
+_TOKEN_KINDS = {'variable': VARIABLE, 'constant': CONSTANT, 'register': REGISTER}
+# reg_0, const_12, loc1, ... in anonymized operands
+ANONYMIZED_NAME_PATTERN = re.compile(f'({REGISTER}|{CONSTANT}|{VARIABLE})\\d+')
+# mnemonic and operand shapes of the anonymized instructions of the idiom-sequences, e.g.
+# ('imul', ('reg_', 'reg_', 'const_')), which the instructions of a function are looked up in
+SKELETONS = Interner()
 
 
 def anonymize_instruction(instr: Instruction):
@@ -24,38 +39,97 @@ def anonymize_instruction(instr: Instruction):
     return anonimized_instructions[0]
 
 
-@dataclass
+class OriginalConstants(dict):
+    """
+    Mapping from anonymized constant names to the constants as disassembled, e.g. {const_0: '4', const_1: '0xbad'}.
+    The constants are parsed only once, value('const_1') -> 2989.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.parsed: Dict[str, Optional[int]] = {}
+
+    def value(self, name: str) -> int:
+        return self.parsed[name]
+
+    def clear(self) -> None:
+        super().clear()
+        self.parsed.clear()
+
+
 class AnonymizedNames:
     """
-    contains mappings from anonymized operands to their original names for variables, constants and registers:
+    Names of one window: mappings from anonymized operands to their original names for variables, constants and
+    registers, kept in sync with the reverse mapping that names the next operand.
 
     variables: {loc0: 'qword ptr [esp]', loc1: 'qword ptr [esp+8]'}
-    constants: {const_0: "4", const_1: '0xbad'}
+    constants: {const_0: "4", const_1: '0xbad'}, see OriginalConstants
     registers: {reg_0: 'eax', reg_1: 'rax'}
+
+    The next number of a kind is the number of its names so far. reset() prepares the structure for the next window,
+    i.e. the mappings handed out before are emptied.
     """
-    variables: dict = field(default_factory=dict)
-    constants: dict = field(default_factory=dict)
-    registers: dict = field(default_factory=dict)
+
+    def __init__(self):
+        self.variables: Dict[str, str] = {}
+        self.constants = OriginalConstants()
+        self.registers: Dict[str, str] = {}
+        self._originals_by_kind = {VARIABLE: self.variables, CONSTANT: self.constants, REGISTER: self.registers}
+        # (kind, original) -> anonymized name
+        self._names: Dict[Tuple[str, str], str] = {}
+
+    def name(self, slot: Tuple[str, str], value: Optional[int] = None) -> str:
+        """
+        :param slot: (kind, original), see OperandTemplate.slots
+        :param value: the parsed constant of a constant slot
+        :return: the anonymized name of the original, a new one at its first occurrence
+        """
+        if (name := self._names.get(slot)) is None:
+            kind, original = slot
+            originals = self._originals_by_kind[kind]
+            name = self._names[slot] = f"{kind}{len(originals)}"
+            originals[name] = original
+            if kind == CONSTANT:
+                self.constants.parsed[name] = value
+        return name
+
+    def reset(self) -> None:
+        for originals in self._originals_by_kind.values():
+            originals.clear()
+        self._names.clear()
 
 
-@dataclass
-class Counters:
+class OperandTemplate(NamedTuple):
     """
-    keeps track on max counter for new anonymized name:
+    Tokenized operand, the anonymized operand is literals[0] + name of slots[0] + literals[1] + ... :
 
-    variables: loc[max_counter]
-    constants: const_[max_counter]
-    registers: reg_[max_counter]
+    [rax+r8*8-0x18] -> literals: ('[', '+', '*', '', ']')
+                       slots:    (('reg_', 'rax'), ('reg_', 'r8'), ('const_', '8'), ('const_', '-0x18'))
+                       values:   (None, None, 8, -24)
+                       shape:    '[reg_+reg_*const_const_]'
     """
-    variables: int = 0
-    constants: int = 0
-    registers: int = 0
+    literals: Tuple[str, ...]
+    # (kind, original token)
+    slots: Tuple[Tuple[str, str], ...]
+    # parsed constants of the slots, None for variables and registers
+    values: Tuple[Optional[int], ...]
+    # the operand with the slots replaced by their kind, as in EncodedInstruction.operands
+    shape: str
+
 
+class OperandCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    size: int
+    hit_rate: float
 
-def anonymize_instructions_smda(instructions: List[Instruction], window: int = 25) -> Tuple[
-    List[Instruction], Dict[str, str], Dict[str, str]]:
+
+def anonymize_instructions_smda(instructions: Sequence[Instruction], window: int = 25) -> Tuple[
+    List[Instruction], OriginalConstants, Dict[str, str]]:
     """
-    :param instructions: list of instructions to be anonymized
+    :param instructions: list of instructions to be anonymized, e.g. an InstructionWindow; at most window
+                         instructions are read
     :return: list of anonymized instructions, mappings from anonymized operands to their original values (constants and registers only?)
 
 
@@ -78,75 +152,229 @@ def anonymize_instructions_smda(instructions: List[Instruction], window: int = 2
     reg_1 -> edx
     """
     anonymized_instructions = []
-    counters = Counters()
     anonymized_names = AnonymizedNames()
-    for instr in instructions[0:window]:
-        # mnemonic = _get_mnemonic_smda(instr)
-        new_operands = []
-        for operand in instr.operands:
-            if not operand: continue
-            anonymized_operand = _anonymize_operand(operand, counters, anonymized_names)
-            new_operands.append(anonymized_operand)
-        anonymized_instructions.append(Instruction(instr.address, instr.mnemonic, tuple(new_operands)))
+    for instr in itertools.islice(instructions, window):
+        anonymized_instructions.append(_anonymize_instruction(instr, anonymized_names))
     return anonymized_instructions, anonymized_names.constants, anonymized_names.registers
 
 
-def _anonymize_operand(operand: str, counters: Counters, anonymizes_names: AnonymizedNames) -> str:
-    # result = _remove_spaces_in_indirect_memory_operands(operand)
-    result = operand
-
-    for m in VARIABLE_PATTERN.finditer(result):
-        variable = m.group(0)
-        anonymized_variable = _get_anonymized_variable_name(variable, anonymizes_names, counters)
-        result = result.replace(variable, anonymized_variable)
-        # since locations are always copied to registers before operations,
-        # if we found location in the operand it is the only one
-        # DWORD PTR [ebp-4], eax -> operand 1: DWORD PTR [ebp-4] -> loc0
-        # DWORD PTR [ebp-4] + ..., eax -> operand 1: DWORD PTR [ebp-4]+... <-WRONG
-        if result == anonymized_variable:
-            return result
-        else:
-            pass
-            #raise Exception(f"Something except of variable in operand {operand} -> |{result}|")
-
-    # TODO can it happen that constant replaces counter in other const_n
-    for const in CONSTANT_PATTERN.findall(result):
-        anonymized_constant = _get_anonymized_constant_name(const, anonymizes_names, counters)
-        result = result.replace(const, anonymized_constant)
-
-    for register in REGISTER_PATTERN.findall(result):
-        anonymized_register = _get_anonymized_register_name(register, anonymizes_names, counters)
-        result = result.replace(register, anonymized_register)
-
-    return result
-
-
-def _get_anonymized_variable_name(variable: str, anonymized_names: AnonymizedNames, counters: Counters) -> str:
-    if variable not in (anonymized_variables := _reverse_dict(anonymized_names.variables)):
-        anonymized_names.variables[(name := f"{VARIABLE}{counters.variables}")] = variable
-        counters.variables += 1
-        return name
-    return anonymized_variables[variable]
+def _anonymize_instruction(instr: Instruction, anonymized_names: AnonymizedNames) -> Instruction:
+    # mnemonic = _get_mnemonic_smda(instr)
+    new_operands = []
+    for operand in instr.operands:
+        if not operand: continue
+        anonymized_operand = _anonymize_operand(operand, anonymized_names)
+        new_operands.append(anonymized_operand)
+    return Instruction(instr.address, instr.mnemonic, tuple(new_operands))
 
 
-def _get_anonymized_constant_name(matched_constant: str, anonymized_names: AnonymizedNames, counters: Counters) -> str:
-    if matched_constant not in (anonymized_constants := _reverse_dict(anonymized_names.constants)):
-        anonymized_names.constants[(name := f"{CONSTANT}{counters.constants}")] = matched_constant
-        counters.constants += 1
-        return name
-    return anonymized_constants[matched_constant]
+class EncodedInstruction(NamedTuple):
+    """
+    Start-independent (prev-)encoding of an anonymized instruction in the style of Baker's parameterized strings:
+
+    mnemonic: mnemonic of the instruction
+    operands: operands with the anonymized names replaced by their kind, e.g. [reg_+reg_*const_]
+    distances: for each anonymized name (in order of occurrence) the number of names back to the previous occurrence
+               of the same original register/constant/variable, 0 if there is none
+    position: number of anonymized names before this instruction
+    skeleton: id of (mnemonic, operands) in SKELETONS, UNKNOWN in a function if no idiom-sequence has it
+    """
+    mnemonic: str
+    operands: tuple
+    distances: tuple
+    position: int
+    skeleton: int
 
 
-def _get_anonymized_register_name(register: str, anonymized_names: AnonymizedNames, counters: Counters) -> str:
-    if register not in (anonymized_registers := _reverse_dict(anonymized_names.registers)):
-        anonymized_names.registers[(name := f"{REGISTER}{counters.registers}")] = register
-        counters.registers += 1
-        return name
-    return anonymized_registers[register]
+def prev_encode_instructions(instructions: List[Instruction]) -> List[EncodedInstruction]:
+    """
+    Encodes all instructions of a function in one pass. In contrast to anonymize_instructions_smda,
+    the encoding does not depend on the start of the window, see window_prev_encoding.
+
+    mov eax, 0x55555556      mov reg_, const_  (0, 0)
+    imul ecx                 imul reg_         (0,)
+    mov eax, ecx         ->  mov reg_, reg_    (3, 2)
+    sar eax, 0x1f            sar reg_, const_  (2, 0)
+    sub edx, eax             sub reg_, reg_    (0, 3)
+    """
+    return FunctionAnonymization(instructions).encoded
 
 
-def _reverse_dict(d: Dict) -> Dict:
-    return {v: k for k, v in d.items()}
+class FunctionAnonymization:
+    """
+    Per-function cache of anonymizations, shared by all idioms:
+
+    - the operands of every instruction are tokenized at most once, mostly by a lookup in the operand template cache
+    - the prev-encoding of the function is computed from the templates
+    - a window is composed from the templates by renaming, the names of the window are reused for the next one
+    """
+
+    def __init__(self, instructions: List[Instruction], window: int = 25):
+        self._instructions = instructions
+        self._window = window
+        self._templates: List[Optional[Tuple[OperandTemplate, ...]]] = [None] * len(instructions)
+        self._names = AnonymizedNames()
+        self._encoded: Optional[List[EncodedInstruction]] = None
+
+    def templates(self, index: int) -> Tuple[OperandTemplate, ...]:
+        """
+        :return: the templates of the (non-empty) operands of the instruction at the given index
+        """
+        if (templates := self._templates[index]) is None:
+            templates = self._templates[index] = tuple(
+                _operand_template(operand) for operand in self._instructions[index].operands if operand)
+        return templates
+
+    @property
+    def encoded(self) -> List[EncodedInstruction]:
+        if self._encoded is None:
+            last_occurrences = {}
+            self._encoded = []
+            position = 0
+            for index, instr in enumerate(self._instructions):
+                templates = self.templates(index)
+                distances = []
+                for template in templates:
+                    for slot in template.slots:
+                        distances.append(position - last_occurrences[slot] if slot in last_occurrences else 0)
+                        last_occurrences[slot] = position
+                        position += 1
+                operands = tuple(template.shape for template in templates)
+                self._encoded.append(EncodedInstruction(
+                    instr.mnemonic, operands, tuple(distances), position - len(distances),
+                    SKELETONS.lookup((instr.mnemonic, operands))))
+        return self._encoded
+
+    def window(self, start: int) -> Tuple[List[Instruction], OriginalConstants, Dict[str, str]]:
+        """
+        Same result as anonymize_instructions_smda(instructions[start:]), but built by renaming the templates
+        instead of parsing the operands again.
+        The original constants and registers are only valid until the next call.
+        """
+        anonymized_instructions = []
+        anonymized_names = self._names
+        anonymized_names.reset()
+        for index in range(start, min(start + self._window, len(self._instructions))):
+            instr = self._instructions[index]
+            operands = tuple(_rename_template(template, anonymized_names) for template in self.templates(index))
+            anonymized_instructions.append(Instruction(instr.address, instr.mnemonic, operands))
+        return anonymized_instructions, anonymized_names.constants, anonymized_names.registers
+
+
+def prev_encode_anonymized_instructions(anonymized_instructions: List[Instruction]) -> List[EncodedInstruction]:
+    """
+    Encodes already anonymized instructions (e.g. idiom patterns), where the anonymized name identifies the operand.
+    """
+    last_occurrences = {}
+    encoded_instructions = []
+    position = 0
+    for instr in anonymized_instructions:
+        encoded_instr = _prev_encode_instruction(instr, lambda m: m.group(0), last_occurrences, position)
+        position += len(encoded_instr.distances)
+        encoded_instructions.append(encoded_instr)
+    return encoded_instructions
+
+
+def window_prev_encoding(encoded_instructions: List[EncodedInstruction], start: int, window: int = 25) -> Iterator[
+    Tuple[int, tuple]]:
+    """
+    Lazily yields the encoding of the window starting at the given index as (skeleton, distances).
+    Distances reaching before the start of the window are cut to 0, so the result equals the encoding of the
+    anonymized window without anonymizing it again.
+    """
+    window_position = encoded_instructions[start].position
+    for index in range(start, min(start + window, len(encoded_instructions))):
+        encoded_instr = encoded_instructions[index]
+        offset = encoded_instr.position - window_position
+        yield encoded_instr.skeleton, tuple(
+            distance if distance <= offset + i else 0 for i, distance in enumerate(encoded_instr.distances))
+
+
+def _prev_encode_instruction(anonymized_instr: Instruction, identify: Callable[[re.Match], Hashable],
+                             last_occurrences: Dict[Hashable, int], position: int) -> EncodedInstruction:
+    operands = []
+    distances = []
+    for operand in anonymized_instr.operands:
+        for m in ANONYMIZED_NAME_PATTERN.finditer(operand):
+            identity = identify(m)
+            distances.append(position - last_occurrences[identity] if identity in last_occurrences else 0)
+            last_occurrences[identity] = position
+            position += 1
+        operands.append(ANONYMIZED_NAME_PATTERN.sub(r'\1', operand))
+    skeleton = SKELETONS.intern((anonymized_instr.mnemonic, tuple(operands)))
+    return EncodedInstruction(anonymized_instr.mnemonic, tuple(operands), tuple(distances), position - len(distances),
+                              skeleton)
+
+
+def _anonymize_operand(operand: str, anonymizes_names: AnonymizedNames) -> str:
+    """
+    DWORD PTR [ebp-4]  -> loc0
+    [rax+r8*8-0x18]    -> [reg_0+reg_1*const_0const_1]
+    """
+    # result = _remove_spaces_in_indirect_memory_operands(operand)
+    return _rename_template(_operand_template(operand), anonymizes_names)
+
+
+def _rename_template(template: OperandTemplate, anonymizes_names: AnonymizedNames) -> str:
+    """
+    Names the slots of the template, the only part of the anonymization of an operand that runs per occurrence.
+    """
+    literals, slots, values, shape = template
+    if not slots:
+        return shape
+    result = [literals[0]]
+    for slot, value, literal in zip(slots, values, literals[1:]):
+        result.append(anonymizes_names.name(slot, value))
+        result.append(literal)
+    return ''.join(result)
+
+
+@functools.lru_cache(maxsize=OPERAND_CACHE_SIZE)
+def _operand_template(operand: str) -> OperandTemplate:
+    """
+    Finds the variables, constants and registers of the operand in one scan, so that neither digits of
+    registers (r8d) nor of already anonymized names (const_1) are taken for constants.
+    The same operands recur all over a binary, so the templates are kept in a bounded LRU cache.
+    """
+    literals = []
+    slots = []
+    position = 0
+    search_position = 0
+    while m := OPERAND_TOKEN_PATTERN.search(operand, search_position):
+        if m.lastgroup == 'register' and lookup_register(m.group(0)) is None:
+            # not a register, but e.g. 'word ptr [rsp]' may follow inside the word (xmmword ptr [rsp])
+            search_position = m.start() + 1
+            continue
+        literals.append(operand[position:m.start()])
+        slots.append((_TOKEN_KINDS[m.lastgroup], m.group(0)))
+        position = search_position = m.end()
+    literals.append(operand[position:])
+    values = tuple(_parse_constant(token) if kind == CONSTANT else None for kind, token in slots)
+    shape = ''.join(literal for pair in itertools.zip_longest(literals, (kind for kind, _ in slots), fillvalue='')
+                    for literal in pair)
+    return OperandTemplate(tuple(literals), tuple(slots), values, shape)
+
+
+def _parse_constant(constant: str) -> Optional[int]:
+    """
+    Constants are parsed as hex, the disassembler writes the small ones (0 to 9) without 0x.
+    :return: None if it is no valid number, e.g. --8
+    """
+    try:
+        return int(constant, 16)
+    except ValueError:
+        return None
+
+
+def operand_cache_info() -> OperandCacheInfo:
+    """
+    :return: statistics of the operand template cache of this process, see OPERAND_CACHE_SIZE
+    """
+    info = _operand_template.cache_info()
+    lookups = info.hits + info.misses
+    return OperandCacheInfo(info.hits, info.misses, info.maxsize, info.currsize,
+                            info.hits / lookups if lookups else 0.0)
+
 
 # def _remove_spaces_in_indirect_memory_operands(operand: str) -> str:
 #     """[edi + ecx*4] -> [edi+ecx*4] -- during comparing anonymized godbolt and smda instructions we don't want to have
@@ -0,0 +1,67 @@
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import tempfile
+from typing import List, Tuple, Optional
+
+# instructions of one function as (offset, mnemonic, operands) as reported by the disassembler
+RawFunction = List[Tuple[int, str, str]]
+
+# increase whenever the stored form changes
+CACHE_FORMAT_VERSION = 1
+
+# settings that do not change the disassembly
+_IGNORED_SETTINGS = {"CONFIG_FILE_PATH", "PROJECT_ROOT", "LOG_PATH", "LOG_LEVEL", "LOG_FORMAT"}
+
+
+class DisassemblyCache:
+    """
+    Persistent, content-addressed cache of disassembled functions.
+
+    An entry is keyed by the SHA-256 of the input bytes together with the disassembler version and configuration,
+    so a binary is only disassembled again when one of them changes. Entries are gzipped JSON files containing only
+    what the matcher needs, i.e. the raw instructions per function.
+    """
+
+    def __init__(self, directory):
+        self.directory = pathlib.Path(directory)
+
+    @staticmethod
+    def key(data: bytes, version: str, config=None, **options) -> str:
+        """
+        :param config: disassembler configuration, all of its upper case settings are part of the key
+        :param options: further parameters of the disassembly, e.g. base address and bitness of a buffer
+        """
+        settings = {name: getattr(config, name) for name in dir(config)
+                    if name.isupper() and name not in _IGNORED_SETTINGS} if config else {}
+        fingerprint = json.dumps([CACHE_FORMAT_VERSION, version, settings, options], sort_keys=True, default=str)
+        return hashlib.sha256(hashlib.sha256(data).digest() + fingerprint.encode()).hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / key[:2] / f"{key}.json.gz"
+
+    def load(self, key: str) -> Optional[List[RawFunction]]:
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        try:
+            with gzip.open(path, "rt") as f:
+                return [[tuple(instruction) for instruction in function] for function in json.load(f)]
+        except (OSError, ValueError):
+            # e.g. truncated by a killed process, it is written again
+            return None
+
+    def store(self, key: str, functions: List[RawFunction]) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, parallel scans of the same binary must not read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt") as f:
+                json.dump(functions, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,198 @@
+import bisect
+import sys
+from typing import List, Tuple, Set, Iterator
+
+import lief
+import numpy as np
+from capstone import Cs, CS_ARCH_X86, CS_MODE_32, CS_MODE_64
+
+from compiler_idioms.disassembly.cache import RawFunction
+from compiler_idioms.disassembly.disassembly import Disassembly
+from compiler_idioms.disassembly.opcode_prefilter import OpcodePrefilter, MAX_INSTRUCTION_LENGTH
+from compiler_idioms.disassembly.smda_disassembly import SMDADisassembly
+
+# alignment between functions, .byte is what capstone reports for data it cannot decode
+PADDING = {"nop", "int3", ".byte"}
+# a chunk ends after these instructions
+CHUNK_ENDS = {"ret", "jmp", "hlt", "ud2"}
+# with the opcode prefilter, decoding starts this many bytes before an anchor hit (doubled while that is not enough)
+# and is continued as long as the next hit is at most this far away
+ANCHOR_LOOKBEHIND = 256
+# bytes passed to capstone at once when only parts of a code area are decoded
+DECODE_BLOCK_SIZE = 256
+
+IMAGE_SCN_MEM_EXECUTE = 0x20000000
+SHF_EXECINSTR = 0x4
+S_ATTR_PURE_INSTRUCTIONS = 0x80000000
+S_ATTR_SOME_INSTRUCTIONS = 0x400
+
+
+class LinearSweepDisassembly(Disassembly):
+    """
+    Fast frontend without any control flow analysis: the executable sections found by lief are disassembled from
+    start to end by capstone. Functions are approximated by chunks that end after ret/jmp, at padding or at a
+    function start known to lief (symbols, exception information).
+
+    Compared to SMDA, data in code sections is disassembled as well and idioms split by a chunk boundary are missed.
+    """
+
+    def __init__(self, path, buffer=None, opcode_prefilter: bool = False):
+        """
+        :param buffer: (bytes, base address, bitness) to disassemble instead of the file
+        :param opcode_prefilter: only decode and keep the chunks containing an anchor opcode of the idioms,
+                                 see OpcodePrefilter and _next_anchored_raw_function
+        """
+        if buffer:
+            data, base_addr, bitness = buffer
+            self._code_areas = [(base_addr, bytes(data))]
+            self._function_starts = set()
+        else:
+            binary = lief.parse(path)
+            if binary is None:
+                raise ValueError(f"lief cannot parse {path}")
+            bitness = 32 if binary.abstract.header.is_32 else 64
+            self._code_areas = self._get_code_areas(binary)
+            self._function_starts = self._get_function_starts(binary)
+        self._capstone = Cs(CS_ARCH_X86, CS_MODE_32 if bitness == 32 else CS_MODE_64)
+        # continue after bytes that cannot be decoded
+        self._capstone.skipdata = True
+        self._opcode_prefilter = OpcodePrefilter(self._code_areas) if opcode_prefilter else None
+        self._sorted_function_starts = sorted(self._function_starts)
+
+    def next_disassembly_function(self):
+        """Generates a chunk of the sections as a list of AssemblyInstruction-s"""
+        raw_functions = self._next_anchored_raw_function() if self._opcode_prefilter else self._next_raw_function()
+        for raw_function in raw_functions:
+            yield SMDADisassembly.instructions_from_raw(raw_function)
+
+    def _next_raw_function(self) -> Iterator[RawFunction]:
+        for address, code in self._code_areas:
+            yield from self._split_into_chunks(self._capstone.disasm_lite(code, address))
+
+    def _next_anchored_raw_function(self) -> Iterator[RawFunction]:
+        """
+        The chunks containing an anchor hit of the opcode prefilter, where capstone only decodes the code from a chunk
+        boundary before a hit on, as long as hits follow within ANCHOR_LOOKBEHIND bytes.
+        """
+        hits = self._opcode_prefilter.hits
+        for address, code in self._code_areas:
+            end = address + len(code)
+            # a chunk boundary of the full sweep, everything before it is done
+            position = address
+            while (index := np.searchsorted(hits, position)) < len(hits) and hits[index] < end:
+                hit = int(hits[index])
+                for chunk in self._chunks_from_boundary(code, address, position, hit):
+                    if self._opcode_prefilter.accepts(chunk):
+                        yield chunk
+                        continue
+                    chunk_start = chunk[0][0]
+                    next_index = np.searchsorted(hits, chunk_start)
+                    if chunk_start > hit and (next_index == len(hits)
+                                              or hits[next_index] - chunk_start > ANCHOR_LOOKBEHIND):
+                        position = chunk_start
+                        break
+                else:
+                    position = end
+
+    def _chunks_from_boundary(self, code: bytes, address: int, position: int, hit: int) -> Iterator[RawFunction]:
+        """
+        :param position: chunk boundary of the full sweep before hit
+        :return: the chunks of the code area from a chunk boundary before the chunk containing hit on
+
+        The boundary is the last known function start before hit, or position if it is at most ANCHOR_LOOKBEHIND bytes
+        before hit. Otherwise, decoding starts there anyway, see _decode_in_sync, and the first chunk, which may have
+        started before, is dropped. While the dropped chunk contains a hit, decoding starts twice as far before hit.
+        """
+        index = bisect.bisect_right(self._sorted_function_starts, hit)
+        if index and self._sorted_function_starts[index - 1] > position:
+            return self._split_into_chunks(self._decode(code, address, self._sorted_function_starts[index - 1]))
+        lookbehind = ANCHOR_LOOKBEHIND
+        while hit - lookbehind > position:
+            chunks = self._split_into_chunks(self._decode_in_sync(code, address, hit - lookbehind))
+            first = next(chunks, None)
+            if first is None or not self._opcode_prefilter.accepts(first):
+                return chunks
+            lookbehind *= 2
+        return self._split_into_chunks(self._decode(code, address, position))
+
+    def _decode(self, code: bytes, address: int, start: int) -> Iterator[Tuple[int, int, str, str]]:
+        """
+        disasm_lite of the code area from start on, block by block, so that nothing is decoded beyond what is consumed
+        """
+        end = address + len(code)
+        while start < end:
+            block_end = min(start + DECODE_BLOCK_SIZE, end)
+            block = code[start - address:block_end - address]
+            for offset, size, mnemonic, operands in self._capstone.disasm_lite(block, start):
+                # the last instructions of a block may be cut off, they are decoded again with the next block
+                if block_end < end and offset + MAX_INSTRUCTION_LENGTH > block_end:
+                    break
+                yield offset, size, mnemonic, operands
+                start = offset + size
+
+    def _decode_in_sync(self, code: bytes, address: int, start: int) -> Iterator[Tuple[int, int, str, str]]:
+        """
+        _decode from start, which may be in the middle of an instruction, beginning with the first instruction that
+        decoding from the next byte reaches as well. x86 code decoded from an arbitrary byte is usually in sync again
+        after a few instructions, and from a common instruction on both decodings are the same.
+        """
+        instructions = self._decode(code, address, start)
+        other_offsets = (offset for offset, _, _, _ in self._decode(code, address, start + 1))
+        other_offset = -1
+        for instruction in instructions:
+            while other_offset < instruction[0]:
+                if (other_offset := next(other_offsets, None)) is None:
+                    return
+            if other_offset == instruction[0]:
+                yield instruction
+                yield from instructions
+                return
+
+    def _split_into_chunks(self, instructions: Iterator[Tuple[int, int, str, str]]) -> Iterator[RawFunction]:
+        chunk = []
+        for offset, _, mnemonic, operands in instructions:
+            if chunk and (mnemonic in PADDING or offset in self._function_starts):
+                yield chunk
+                chunk = []
+            if mnemonic in PADDING:
+                continue
+            chunk.append((offset, mnemonic, operands))
+            if mnemonic in CHUNK_ENDS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _get_code_areas(binary) -> List[Tuple[int, bytes]]:
+        """
+        :return: (virtual address, content) of all executable sections
+        """
+        code_areas = []
+        for section in binary.sections:
+            if isinstance(binary, lief.PE.Binary):
+                if section.characteristics & IMAGE_SCN_MEM_EXECUTE:
+                    code_areas.append((binary.imagebase + section.virtual_address, bytes(section.content)))
+            elif isinstance(binary, lief.ELF.Binary):
+                if int(section.flags) & SHF_EXECINSTR and section.virtual_address:
+                    code_areas.append((section.virtual_address, bytes(section.content)))
+            elif int(section.flags) & (S_ATTR_PURE_INSTRUCTIONS | S_ATTR_SOME_INSTRUCTIONS):
+                code_areas.append((section.virtual_address, bytes(section.content)))
+        return sorted(code_areas)
+
+    @staticmethod
+    def _get_function_starts(binary) -> Set[int]:
+        try:
+            functions = binary.functions
+        except Exception:
+            # e.g. not supported for the format by the installed lief version
+            return set()
+        # relative virtual addresses for PE
+        image_base = binary.imagebase if isinstance(binary, lief.PE.Binary) else 0
+        return {image_base + function.address for function in functions}
+
+
+if __name__ == "__main__":
+    da = LinearSweepDisassembly(sys.argv[1])
+    for bb in da.next_disassembly_function():
+        print(bb)
@@ -0,0 +1,67 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from compiler_idioms.disassembly.cache import RawFunction
+
+# longest x86 instruction, a hit in the last instruction of a function lies before its address + this
+MAX_INSTRUCTION_LENGTH = 15
+
+
+def find_anchor_offsets(data) -> np.ndarray:
+    """
+    Vectorized scan of raw bytes for the opcodes of the anchor instructions of the idioms:
+
+    69 /r, 6B /r          imul r, r/m, imm32/imm8
+    0F AF /r              imul r, r/m
+    F7 /4, /5, /6, /7     mul, imul, div, idiv r/m
+    C1 /5, /7, D1 /5, /7  shr, sar r/m by imm8 or 1
+
+    A hit does not need to be the start of an instruction, i.e. there are false positives but no misses.
+    :return: sorted offsets of the opcode bytes
+    """
+    code = np.frombuffer(memoryview(data), dtype=np.uint8)
+    if len(code) < 2:
+        return np.empty(0, dtype=np.int64)
+    opcode, next_byte = code[:-1], code[1:]
+    # reg field of the ModRM byte, i.e. the /digit
+    digit = (next_byte >> 3) & 7
+    hits = (opcode == 0x69) | (opcode == 0x6B)
+    hits |= (opcode == 0x0F) & (next_byte == 0xAF)
+    hits |= (opcode == 0xF7) & (digit >= 4)
+    hits |= ((opcode == 0xC1) | (opcode == 0xD1)) & ((digit == 5) | (digit == 7))
+    return np.flatnonzero(hits)
+
+
+class OpcodePrefilter:
+    """
+    Keeps only the functions that contain one of the anchor opcodes, so that all other functions are neither
+    converted to instructions nor matched.
+
+    Idiom sequences without any anchor instruction (e.g. multiplication by lea/shl/add, modulo by a power of two
+    using and) are only found in functions that contain an anchor as well, so the prefilter trades recall for speed.
+    """
+
+    def __init__(self, code_areas: List[Tuple[int, bytes]]):
+        """
+        :param code_areas: (virtual address, bytes) of the memory to scan, e.g. the mapped image
+        """
+        self.hits = np.sort(np.concatenate(
+            [find_anchor_offsets(data) + address for address, data in code_areas] or [np.empty(0, dtype=np.int64)]))
+
+    def contains_anchor(self, start: int, end: int) -> bool:
+        """
+        :return: whether there is a hit in [start, end)
+        """
+        index = np.searchsorted(self.hits, start)
+        return bool(index < len(self.hits) and self.hits[index] < end)
+
+    def accepts(self, raw_function: RawFunction) -> bool:
+        if not raw_function:
+            return False
+        offsets = [offset for offset, _, _ in raw_function]
+        # the instructions of a function are not necessarily contiguous
+        return self.contains_anchor(min(offsets), max(offsets) + MAX_INSTRUCTION_LENGTH)
+
+    def filter(self, raw_functions: List[RawFunction]) -> List[RawFunction]:
+        return [raw_function for raw_function in raw_functions if self.accepts(raw_function)]
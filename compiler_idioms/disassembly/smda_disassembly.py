@@ -1,11 +1,14 @@
-import json
 import pathlib
 import sys
+from typing import List, Optional
 
 from icecream import ic
 from smda.Disassembler import Disassembler
+from smda.utility.FileLoader import FileLoader
 
+from compiler_idioms.disassembly.cache import DisassemblyCache, RawFunction
 from compiler_idioms.disassembly.disassembly import Disassembly
+from compiler_idioms.disassembly.opcode_prefilter import OpcodePrefilter
 from compiler_idioms.instruction import Instruction
 
 MNEMONICS_TO_CONSIDER = {"movsxd": "movsx"}
@@ -16,68 +19,87 @@ class SMDADisassembly(Disassembly):
     Class that generates assembly in got from SMDA.
     """
 
-    def __init__(self, path, buffer=None):
+    def __init__(self, path, buffer=None, cache: Optional[DisassemblyCache] = None, opcode_prefilter: bool = False):
+        """
+        :param buffer: (bytes, base address, bitness) to disassemble instead of the file
+        :param cache: disassembly cache, if the binary was already disassembled with the same SMDA version and
+                      config, SMDA is not run at all and self.disassembly stays None
+        :param opcode_prefilter: only keep the functions containing an anchor opcode of the idioms,
+                                 see OpcodePrefilter
+        """
         self._disassembler = Disassembler()
-        if not buffer:
-            self.disassembly = self._disassembler.disassembleFile(path)
-        else:
-            self.disassembly = self._disassembler.disassembleBuffer(*buffer)
+        self.disassembly = None
+        self._functions = None
+        key = None
+        prefiltered_key = None
+        if cache:
+            data = pathlib.Path(path).read_bytes() if not buffer else buffer[0]
+            options = {"base_addr": buffer[1], "bitness": buffer[2]} if buffer else {}
+            key = cache.key(data, self._disassembler.config.VERSION, self._disassembler.config, **options)
+            if opcode_prefilter:
+                # the prefiltered functions are cached as well, so that a hit does not map the file again for the scan
+                prefiltered_key = cache.key(data, self._disassembler.config.VERSION, self._disassembler.config,
+                                            opcode_prefilter=True, **options)
+                self._functions = cache.load(prefiltered_key)
+                if self._functions is not None:
+                    return
+            self._functions = cache.load(key)
+        if self._functions is None:
+            if not buffer:
+                self.disassembly = self._disassembler.disassembleFile(path)
+            else:
+                self.disassembly = self._disassembler.disassembleBuffer(*buffer)
+            self._functions = self._get_raw_functions(self.disassembly)
+            # do not keep incomplete results, e.g. after a timeout
+            if cache and self.disassembly.status == "ok":
+                cache.store(key, self._functions)
+        if opcode_prefilter:
+            self._functions = self._get_opcode_prefilter(path, buffer).filter(self._functions)
+            if cache and (self.disassembly is None or self.disassembly.status == "ok"):
+                cache.store(prefiltered_key, self._functions)
 
+    @staticmethod
+    def _get_opcode_prefilter(path, buffer=None) -> OpcodePrefilter:
+        if buffer:
+            return OpcodePrefilter([(buffer[1], buffer[0])])
+        # scan the image mapped the same way as for the disassembly, so that offsets translate to addresses
+        loader = FileLoader(path, map_file=True)
+        return OpcodePrefilter([(loader.getBaseAddress(), loader.getData())])
 
-    # def next_disassembly_function(self):
-    #     """Generates a disassembly block as a list of AssemblyInstruction-s"""
-    #     for _, smda_function in self.disassembly.xcfg.items():
-    #         assembly_lines = []
-    #         for block, instructions in smda_function.blocks.items():
-    #
-    #             for smda_instruction in instructions:
-    #                 operands = [
-    #                     self._remove_spaces_in_indirect_memory_operands(op) for op in smda_instruction.operands.split(",")
-    #                 ]
-    #                 if smda_instruction.mnemonic in {"jns", "js", "jmp", "je", "jne", "ja", "jb", "jae", "jbe", "jge", "jle"}:
-    #                     operands = []
-    #                 assembly_lines.append(
-    #                     Instruction(
-    #                         smda_instruction.offset,
-    #                         self._get_mnemonic_smda(smda_instruction.mnemonic),
-    #                         tuple(operands),
-    #                         matched=False
-    #                     )
-    #                 )
-    #         yield assembly_lines
-    #
-    #     with pathlib.Path("diassembly.json").open('w') as f:
-    #         json.dump(self.disassembly.toDict(), f, indent=4)
-    #
-    #     self.disassembly.toDict()
+    @staticmethod
+    def _get_raw_functions(disassembly) -> List[RawFunction]:
+        return [
+            [(smda_instruction.offset, smda_instruction.mnemonic, smda_instruction.operands)
+             for smda_instruction in smda_function.getInstructions()]
+            for smda_function in disassembly.getFunctions()
+        ]
 
     def next_disassembly_function(self):
         """Generates a disassembly block as a list of AssemblyInstruction-s"""
-        for smda_function in self.disassembly.getFunctions():
-            assembly_lines = []
-            #print(smda_function)
-            for smda_instruction in smda_function.getInstructions():
-
+        for raw_function in self._functions:
+            yield self.instructions_from_raw(raw_function)
 
-                operands = [
-                    self._remove_spaces_in_indirect_memory_operands(op) for op in smda_instruction.operands.split(",")
-                ]
-                if smda_instruction.mnemonic in {"jns", "js", "jmp", "je", "jne", "ja", "jb", "jae", "jbe", "jge", "jle"}:
-                    operands = []
-                assembly_lines.append(
-                    Instruction(
-                        smda_instruction.offset,
-                        self._get_mnemonic_smda(smda_instruction.mnemonic),
-                        tuple(operands),
-                        matched=False
-                    )
+    @classmethod
+    def instructions_from_raw(cls, raw_function: RawFunction) -> List[Instruction]:
+        """
+        Normalizes the instructions as reported by capstone to the form used by the patterns
+        """
+        assembly_lines = []
+        for offset, mnemonic, operands in raw_function:
+            operands = [
+                cls._remove_spaces_in_indirect_memory_operands(op) for op in operands.split(",")
+            ]
+            if mnemonic in {"jns", "js", "jmp", "je", "jne", "ja", "jb", "jae", "jbe", "jge", "jle"}:
+                operands = []
+            assembly_lines.append(
+                Instruction(
+                    offset,
+                    cls._get_mnemonic_smda(mnemonic),
+                    tuple(operands),
+                    matched=False
                 )
-            yield assembly_lines
-
-        with pathlib.Path("diassembly.json").open('w') as f:
-            json.dump(self.disassembly.toDict(), f, indent=4)
-
-        self.disassembly.toDict()
+            )
+        return assembly_lines
 
     @staticmethod
     def _remove_spaces_in_indirect_memory_operands(operand: str) -> str:
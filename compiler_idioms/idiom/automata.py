@@ -0,0 +1,87 @@
+from collections import deque
+from typing import List, Dict, Tuple, Iterator
+
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+
+# interned mnemonic and operand shapes of an anonymized instruction, i.e. without the numbering of the anonymized
+# names: imul reg_0, reg_1, const_0  ->  SKELETONS.intern(('imul', ('reg_', 'reg_', 'const_')))
+# Unlike the numbering, the skeleton does not depend on the position where the anonymization of a window starts.
+Skeleton = int
+
+
+class SkeletonAutomaton:
+    """
+    Aho-Corasick automaton over the skeletons of all idiom sequences.
+
+    Streaming the skeletons of a function through the automaton once yields every (start, pattern id) pair for which
+    the skeletons match. Equal skeletons are necessary for equal anonymized sequences, so only these candidates need
+    the full anonymized comparison.
+    """
+
+    def __init__(self):
+        self._transitions: List[Dict[Skeleton, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        # pattern id -> (idiom index, sequence index, length)
+        self.patterns: List[Tuple[int, int, int]] = []
+
+    @classmethod
+    def from_idioms(cls, idioms: List[InstructionSequence]) -> "SkeletonAutomaton":
+        automaton = cls()
+        for idiom_index, idiom in enumerate(idioms):
+            for sequence_index, encoded_sequence in enumerate(idiom.encoded_sequences):
+                skeletons = [encoded.skeleton for encoded in encoded_sequence]
+                automaton.add(skeletons, idiom_index, sequence_index)
+        automaton.build()
+        return automaton
+
+    def add(self, skeletons: List[Skeleton], idiom_index: int, sequence_index: int) -> None:
+        if not skeletons:
+            return
+        state = 0
+        for key in skeletons:
+            if key not in self._transitions[state]:
+                self._transitions.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._transitions[state][key] = len(self._transitions) - 1
+            state = self._transitions[state][key]
+        self._output[state].append(len(self.patterns))
+        self.patterns.append((idiom_index, sequence_index, len(skeletons)))
+
+    def build(self) -> None:
+        """
+        Computes the failure links (breadth first) and merges the outputs along them.
+        """
+        queue = deque()
+        for state in self._transitions[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for key, next_state in self._transitions[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and key not in self._transitions[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._transitions[fail].get(key, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_candidates(self, skeletons: List[Skeleton]) -> Iterator[Tuple[int, int]]:
+        """
+        Streams the skeletons of a function through the automaton.
+        :return: (start index, pattern id) for every pattern whose skeleton occurs in the function
+        """
+        state = 0
+        for end, key in enumerate(skeletons):
+            while state and key not in self._transitions[state]:
+                state = self._fail[state]
+            state = self._transitions[state].get(key, 0)
+            for pattern_id in self._output[state]:
+                yield end - self.patterns[pattern_id][2] + 1, pattern_id
+
+    def candidate_starts(self, skeletons: List[Skeleton]) -> List[int]:
+        """
+        :return: sorted start indices at which at least one pattern might match
+        """
+        return sorted({start for start, _ in self.iter_candidates(skeletons)})
@@ -18,8 +18,11 @@ class Idiom(ABC):
         return False
 
     @abstractmethod
-    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str]) -> Match:
+    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str],
+               candidates: List[int] = None) -> Match:
         """
-
+        Returns the match of this idiom at the beginning of the given (anonymized) sequence, if any.
+        If candidates are given, only the idiom sequences with these indices are considered.
+        The original constants are an OriginalConstants, original_constants.value(name) is the parsed constant.
         """
         pass
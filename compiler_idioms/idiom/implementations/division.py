@@ -5,7 +5,7 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.registry import signed_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
@@ -14,13 +14,12 @@ from config import ROOT
 # TEST_PATTERN_PATH = TEST_DIR / "divs.json"
 TEST_PATTERN_PATH = ROOT / "patterns" / "patterns-divs-O0.json"
 PATTERN_DIR = ROOT / 'patterns'
-HEX_BASE = 16
 
 
 class SignedDivisionInstructionSequence(InstructionSequence):
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("divs")
-        self.magic_table = compute_magic_numbers_if_not_exists()
+        self.magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -28,8 +27,9 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -75,7 +75,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        constant = 2 ** int(original_constants.get(constant), HEX_BASE)
+        constant = 2 ** original_constants.value(constant)
         if sequence[-1].mnemonic == 'neg':
             constant = -constant
         match.constant = constant
@@ -114,7 +114,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 imul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                         break
         if not imul:
             return None
@@ -134,11 +134,11 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                     if register == original_register0 or register.endswith(lower0):
                         ic(current)
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
             ic(magic)
 
@@ -148,7 +148,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val >= 32 and not power:
                             power = val
                             power_instr = instr
@@ -160,9 +160,9 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val < 0x1f and not extra:
-                            extra = int(original_constants.get(op), HEX_BASE)
+                            extra = original_constants.value(op)
                             break
 
         # magic = int(original_constants.get("const_0"), HEX_BASE)
@@ -202,7 +202,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 op2 = instr.operands[1]
                 if op2.startswith("const"):
                     ic(op2)
-                    val = int(original_constants.get(op2), HEX_BASE)
+                    val = original_constants.value(op2)
                     if val == 31:
                         sign_reg = op1
                         sign_index = i
@@ -268,7 +268,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        constant = 2 ** int(original_constants.get(constant), HEX_BASE)
+        constant = 2 ** original_constants.value(constant)
         if sequence[-1].mnemonic == 'neg':
             constant = -constant
         match.constant = constant
@@ -303,7 +303,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 imul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                         break
         if not magic:
             if not imul:
@@ -327,12 +327,12 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                     if register == original_register0 or register.endswith(lower0):
                         ic(current)
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             ic()
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             ic()
                             break
             ic(magic)
@@ -342,7 +342,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val >= 32 and not power:
                             power = val
                             power_instr = instr
@@ -354,9 +354,9 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val < 0x1f and not extra:
-                            extra = int(original_constants.get(op), HEX_BASE)
+                            extra = original_constants.value(op)
                             break
 
         # magic = int(original_constants.get("const_0"), HEX_BASE)
@@ -385,7 +385,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 op1 = instr.operands[0]
                 op2 = instr.operands[1]
                 if op2.startswith("const"):
-                    val = int(original_constants.get(op2), HEX_BASE)
+                    val = original_constants.value(op2)
                     if val == 31:
                         sign_reg = op1
             if instr.mnemonic == 'sub':
@@ -5,20 +5,19 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.registry import signed_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
 PATTERN_DIR = ROOT / 'patterns'
-HEX_BASE = 16
 
 
 class SignedDivisionInstructionSequence86(InstructionSequence):
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("divs")
-        self.magic_table = compute_magic_numbers_if_not_exists()
+        self.magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -26,8 +25,9 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -70,7 +70,7 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        constant = 2 ** int(original_constants.get(constant), HEX_BASE)
+        constant = 2 ** original_constants.value(constant)
         if sequence[-1].mnemonic == 'neg':
             constant = -constant
         match.constant = constant
@@ -111,7 +111,7 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
                 imul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                         break
         if not magic:
             ic()
@@ -137,12 +137,12 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
                     if register == original_register0 or register.endswith(lower0):
                         ic(current)
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             ic()
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             ic()
                             break
             ic(magic)
@@ -152,7 +152,7 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val >= 32 and not power:
                             power = val
                             power_instr = instr
@@ -164,9 +164,9 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val < 0x1f and not extra:
-                            extra = int(original_constants.get(op), HEX_BASE)
+                            extra = original_constants.value(op)
                             break
 
         # magic = int(original_constants.get("const_0"), HEX_BASE)
@@ -195,7 +195,7 @@ class SignedDivisionInstructionSequence86(InstructionSequence):
                 op1 = instr.operands[0]
                 op2 = instr.operands[1]
                 if op2.startswith("const"):
-                    val = int(original_constants.get(op2), HEX_BASE)
+                    val = original_constants.value(op2)
                     if val == 31:
                         sign_reg = op1
             if instr.mnemonic == 'sub':
@@ -5,21 +5,19 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
 
 #ic.disable()
 class UnsignedDivisionInstructionSequence(InstructionSequence):
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("divu")
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -27,8 +25,9 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence[:match.length]
             )
@@ -43,7 +42,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         match.operation = "division unsigned"
         match.operand = self._get_register_operand(original_registers)
         if len(original_constants.values()) == 1:
-            match.constant = 2 ** int(original_constants.get('const_0'), HEX_BASE)
+            match.constant = 2 ** original_constants.value('const_0')
             return match
         imul = [x for x in sequence if x.mnemonic in {'imul', 'mul'}]
         if not imul:
@@ -72,7 +71,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        match.constant = 2 ** int(original_constants.get(constant), HEX_BASE)
+        match.constant = 2 ** original_constants.value(constant)
         return match
 
     def handle_magic_numbers_division(
@@ -105,18 +104,18 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         if first_shift:
             return self._handle_as_signed(original_constants, original_registers, sequence)
         ic()
-        magic = int(original_constants.get("const_0"), HEX_BASE)
-        power = int(original_constants.get("const_1"), HEX_BASE)
+        magic = original_constants.value("const_0")
+        power = original_constants.value("const_1")
         extra = 0
         ic(magic)
         if 'const_2' in original_constants:
-            extra = int(original_constants.get("const_2"), HEX_BASE)
+            extra = original_constants.value("const_2")
             if extra < 0x1F:
                 # case 5
                 power += extra
 
         if 'const_3' in original_constants:
-            extra2 = int(original_constants.get("const_3"), HEX_BASE)
+            extra2 = original_constants.value("const_3")
             power += extra2
 
         result =  self.magic_table.get((magic, power))
@@ -136,7 +135,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 imul_index = i
                 for op in x.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
 
         imul = sequence[imul_index]
         if not magic:
@@ -153,17 +152,17 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     register = original_registers[current.operands[0]]
                     if register == original_register0 or register.endswith(lower0):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
         for x in sequence:
             if x.mnemonic == 'shr':
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
 
         result = self.signed_magic_table.get((magic, power))
         if not result:
@@ -185,7 +184,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 if i.mnemonic == 'shr':
                     shift_instr = i
                     break
-            shift = int(original_constants.get(shift_instr.operands[-1]), HEX_BASE)
+            shift = original_constants.value(shift_instr.operands[-1])
             power += shift
             if shift < 32:
 
@@ -306,7 +305,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 imul_index = i
                 for op in x.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
 
         imul = sequence[imul_index]
 
@@ -324,18 +323,18 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     register = original_registers[current.operands[0]]
                     if register == original_register0 or register.endswith(lower0):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
 
         for x in sequence:
             if x.mnemonic == 'shr':
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
 
         result = self.signed_magic_table.get((magic, power))
         if not result:
@@ -356,7 +355,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 if i.mnemonic == 'shr':
                     shift_instr = i
                     break
-            shift = int(original_constants.get(shift_instr.operands[-1]), HEX_BASE)
+            shift = original_constants.value(shift_instr.operands[-1])
             power += shift
             if shift < 32:
 
@@ -1,17 +1,14 @@
-import ctypes
-
 from typing import List, Dict, Tuple
 
 from icecream import ic
 
-from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence, SIGNED_TYPES, UNSIGNED_TYPES
+from compiler_idioms.idiom.registry import signed_magic_table, idiom_sequences
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
 #ic.disable()
 
 
@@ -23,17 +20,23 @@ class SignedDivisionInstructionSequence(InstructionSequence):
     def __init__(self):
         self.abbrev_operation_name = "divs"
         self.operation_name = "division"
-        sequences = load_pattern_sequences_for_operation(self.abbrev_operation_name)
-        self.magic_table = compute_magic_numbers_if_not_exists()
-        super().__init__(sequences)
+        self.magic_table = signed_magic_table()
+        # per operation width, 64 for the movabs/imul r64 sequences of long long divisions on x64
+        self.magic_tables = {32: self.magic_table, 64: signed_magic_table(bits=64)}
+        super().__init__(idiom_sequences(type(self)))
+
+    @classmethod
+    def load_sequences(cls) -> List[List[Instruction]]:
+        return load_pattern_sequences_for_operation("divs")
 
     def search(
             self,
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -57,8 +60,9 @@ class SignedDivisionInstructionSequence(InstructionSequence):
         #W match.length == 2 and sequence[0].mnemonic == 'mov' and sequence[1].mnemonic == 'shr': return None
         div = [x for x in sequence if x.mnemonic in self.DIV]
         if div:
-            const = int(original_constants['const_0'], HEX_BASE)
-            match.constant = ctypes.c_int32(const).value
+            const = original_constants.value('const_0')
+            width = self._operation_width(sequence[:match.length], original_registers)
+            match.constant = SIGNED_TYPES[width](const).value
             return match
         mul = [x for x in sequence if x.mnemonic in self.MUL]
         if not mul:
@@ -76,7 +80,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        constant = 2 ** int(original_constants.get(constant), HEX_BASE)
+        constant = 2 ** original_constants.value(constant)
         if sequence[-1].mnemonic == 'neg':
             constant = -constant
         match.constant = constant
@@ -90,42 +94,51 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
     ):
         match.constant = None
-        match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence)
+        width = self._operation_width(sequence[:match.length], original_registers)
+        match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence,
+                                                                width)
         return match
 
     def _get_register_operand(self, original_registers: Dict[str, str]):
         return original_registers.get("reg_1", [])
 
     def _get_original_constant_from_magic(
-            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
+            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction],
+            width: int = 32
     ) -> int:
         magic, imul_index = self._get_mul_constant_and_position(sequence, original_constants)
-        if not magic:
+        if not magic and width == 64:
+            magic = self._backtrack_wide_magic_number(sequence, original_constants, original_registers)
+        elif not magic:
             magic = self._backtrack_magic_number(imul_index, sequence, original_constants, original_registers)
-        power = self._accumulate_shift_amount(sequence, original_constants)
-        quotient = self._lookup(magic, power)
-        if ctypes.c_int32(magic).value < 0:
+        power = self._accumulate_shift_amount(sequence, original_constants, width)
+        quotient = self._lookup(magic, power, width)
+        if SIGNED_TYPES[width](magic).value < 0:
             # case 7
-            unsigned_magic = ctypes.c_uint32(magic).value
-            quotient = self._lookup(unsigned_magic, power)
+            unsigned_magic = UNSIGNED_TYPES[width](magic).value
+            quotient = self._lookup(unsigned_magic, power, width)
             if not quotient:
-                negative_magic = ctypes.c_int32(magic).value
-                quotient = self._lookup(negative_magic, power)
+                negative_magic = SIGNED_TYPES[width](magic).value
+                quotient = self._lookup(negative_magic, power, width)
 
         if quotient and quotient < 0:
             return quotient
-        if self._is_negative(original_constants, original_registers, sequence):
+        if self._is_negative(original_constants, original_registers, sequence, width):
             quotient = -quotient
         return quotient
 
-    def _lookup(self, magic: int, power: int) -> int:
-        quotient = self._search_magic_table(magic, power)
+    def _lookup(self, magic: int, power: int, width: int = 32) -> int:
+        """
+        :param power: the shift amounts of the sequence, without the shift by width taking the high half of the product
+        """
+        quotient = self._search_magic_table(magic, power, width)
         if not quotient:
-            quotient = self._search_magic_table(magic, power + 32)
+            quotient = self._search_magic_table(magic, power + width, width)
         return quotient
 
     def _is_negative(
-            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
+            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction],
+            width: int = 32
     ) -> int:
         # case 3
         sign_reg = None
@@ -137,8 +150,8 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 destination = instr.operands[0]
                 source = instr.operands[1]
                 if self._is_constant(source):
-                    val = int(original_constants.get(source), HEX_BASE)
-                    if val == 31:
+                    val = original_constants.value(source)
+                    if val == width - 1:
                         sign_reg = destination
                         sign_index = i
                         break
@@ -162,8 +175,8 @@ class SignedDivisionInstructionSequence(InstructionSequence):
             return True
         return False
 
-    def _search_magic_table(self, magic: int, power: int) -> int:
-        quotient = self.magic_table.get((magic, power))
+    def _search_magic_table(self, magic: int, power: int, width: int = 32) -> int:
+        quotient = self.magic_tables[width].get((magic, power))
         return quotient
 
     def _get_mul_constant_and_position(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> Tuple[
@@ -175,18 +188,20 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if self._is_constant(op):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
         return magic, first_mul_index
 
-    def _accumulate_shift_amount(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> int:
+    def _accumulate_shift_amount(self, sequence: List[Instruction], original_constants: Dict[str, str],
+                                 width: int = 32) -> int:
         result = 0
         for instr in sequence:
             if instr.mnemonic in self.RIGHT_SHIFT:
                 for op in instr.operands:
                     if self._is_constant(op):
-                        val = int(original_constants.get(op), HEX_BASE)
-                        if val != 0x1f:
-                            result += int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
+                        # not the shift extracting the sign
+                        if val != width - 1:
+                            result += original_constants.value(op)
         return result
 
     def _backtrack_magic_number(self, imul_index: int, sequence: List[Instruction], original_constants: Dict[str, str],
@@ -210,7 +225,7 @@ class SignedDivisionInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if self._is_constant(current_instr.operands[-1]):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             return magic_number
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -5,15 +5,12 @@ from typing import List, Dict, Tuple
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
-
 
 #ic.disable()
 class UnsignedDivisionInstructionSequence(InstructionSequence):
@@ -21,8 +18,8 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
 
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("divu")
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -30,8 +27,9 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -61,7 +59,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
 
     @staticmethod
     def _handle_unsigned_power_of_two_division(match: Match, original_constants: Dict[str, str]):
-        match.constant = 2 ** int(original_constants.get('const_0'), HEX_BASE)
+        match.constant = 2 ** original_constants.value('const_0')
         return match
 
     def _handle_unsigned_magic_numbers_division(
@@ -123,7 +121,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
         return magic, first_mul_index
 
     def _accumulate_shr_amount(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> int:
@@ -133,7 +131,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 ic(x)
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
                         ic(power)
         return power
 
@@ -156,7 +154,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             ic(magic_number)
                             break
                         else:
@@ -185,7 +183,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         if not shift_instr:
             return 0
 
-        shift = int(original_constants.get(shift_instr.operands[-1]), HEX_BASE)
+        shift = original_constants.value(shift_instr.operands[-1])
         power += shift
         if shift < 32:
 
@@ -3,15 +3,12 @@ from typing import List, Dict, Tuple
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
-
 
 #ic.disable()
 
@@ -22,8 +19,8 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("divu")
         #sequences = sorted(sequences, key=lambda x: len(x), reverse=False)
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -31,8 +28,9 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             ic(sequence)
             ic(sequence[:match.length])
             ic(match)
@@ -65,7 +63,7 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
 
     @staticmethod
     def _handle_unsigned_power_of_two_division(match: Match, original_constants: Dict[str, str]):
-        match.constant = 2 ** int(original_constants.get('const_0'), HEX_BASE)
+        match.constant = 2 ** original_constants.value('const_0')
         return match
 
     def _handle_unsigned_magic_numbers_division(
@@ -122,7 +120,7 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
         return magic, first_mul_index
 
     def _accumulate_shr_amount(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> int:
@@ -132,7 +130,7 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
                 ic(x)
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
                         ic(power)
         return power
 
@@ -155,7 +153,7 @@ class UnsignedDivisionInstructionSequence86(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             ic(magic_number)
                             break
                         else:
@@ -4,16 +4,18 @@ from typing import List, Dict, Tuple
 
 from icecream import ic
 
-from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence, UNSIGNED_TYPES
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table, idiom_sequences
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
-
+# The shifted and perturbed magic numbers tried by _handle_as_signed and _deal_with_corner_cases were derived with
+# tables of the small divisors. Among all 32-bit divisors they mostly hit unrelated large ones, so they are only looked
+# up among those divisors.
+PERTURBATION_MAX_SIGNED_DIVISOR = 2 ** 10 - 1
+PERTURBATION_MAX_UNSIGNED_DIVISOR = 2 ** 11 - 1
 
 #ic.disable()
 class UnsignedDivisionInstructionSequence(InstructionSequence):
@@ -21,18 +23,26 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
     DIV = {'div', 'idiv'}
 
     def __init__(self):
-        sequences = load_pattern_sequences_for_operation("divu")
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
-        super().__init__(sequences)
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
+        self.perturbation_magic_table = unsigned_magic_table(PERTURBATION_MAX_UNSIGNED_DIVISOR)
+        self.perturbation_signed_magic_table = signed_magic_table(PERTURBATION_MAX_SIGNED_DIVISOR)
+        # movabs/mul r64 sequences of unsigned long long divisions on x64
+        self.wide_magic_table = unsigned_magic_table(bits=64)
+        super().__init__(idiom_sequences(type(self)))
+
+    @classmethod
+    def load_sequences(cls) -> List[List[Instruction]]:
+        return load_pattern_sequences_for_operation("divu")
 
     def search(
             self,
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -48,14 +58,15 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         match.operand = self._get_register_operand(original_registers)
         div = [x for x in sequence if x.mnemonic in self.DIV]
         if div:
-            return self.handle_patterns_with_div(match, original_constants)
+            return self.handle_patterns_with_div(match, original_constants, original_registers, sequence)
         if self._is_single_shift_right(sequence[:match.length], original_constants):
             return self._handle_unsigned_power_of_two_division(match, original_constants)
         return self._handle_unsigned_magic_numbers_division(match, original_constants, original_registers, sequence)
 
-    def handle_patterns_with_div(self, match, original_constants):
-        const = int(original_constants['const_0'], HEX_BASE)
-        original_constant = ctypes.c_int32(const).value
+    def handle_patterns_with_div(self, match, original_constants, original_registers, sequence):
+        const = original_constants.value('const_0')
+        width = self._operation_width(sequence[:match.length], original_registers)
+        original_constant = ctypes.c_int32(const).value if width == 32 else UNSIGNED_TYPES[width](const).value
         match.constant = original_constant
         return match
 
@@ -71,7 +82,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
 
     @staticmethod
     def _handle_unsigned_power_of_two_division(match: Match, original_constants: Dict[str, str]):
-        match.constant = 2 ** int(original_constants.get('const_0'), HEX_BASE)
+        match.constant = 2 ** original_constants.value('const_0')
         return match
 
     def _handle_unsigned_magic_numbers_division(
@@ -81,6 +92,10 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             original_registers: Dict[str, str],
             sequence: List[Instruction],
     ):
+        if self._operation_width(sequence[:match.length], original_registers) == 64:
+            match.constant = self._get_original_constant_from_wide_magic(original_constants, original_registers,
+                                                                         sequence[:match.length])
+            return match
         match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence)
         return match
 
@@ -97,9 +112,9 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             if not result:
                 result = self.magic_table.get((magic, power + 32))
         else:
-            result = self.magic_table.get((magic, power+5))
+            result = self.perturbation_magic_table.get((magic, power+5))
             if not result:
-                result = self.magic_table.get((magic, power + 32+5))
+                result = self.perturbation_magic_table.get((magic, power + 32+5))
 
         if not result:
             result = self._handle_as_signed(magic, power, sequence, original_constants)
@@ -107,15 +122,31 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 result = self._handle_as_signed(magic, power + 32, sequence, original_constants)
         return result
 
+    def _get_original_constant_from_wide_magic(
+            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
+    ) -> int:
+        """
+        64-bit division: the minimal magic numbers of gcc and clang, without the perturbations handled for 32-bit.
+        A shift before the multiplication is the one of an even divisor, see UnsignedMagicDivisors.get_pre_shifted.
+        """
+        magic, mul_position = self._get_mul_constant_and_position(sequence, original_constants)
+        if not magic:
+            magic = self._backtrack_wide_magic_number(sequence, original_constants, original_registers)
+        pre_shift = self._accumulate_shr_amount(sequence[:mul_position], original_constants)
+        power = self._accumulate_shr_amount(sequence[mul_position:], original_constants) + 64
+        if pre_shift:
+            return self.wide_magic_table.get_pre_shifted((magic, power), pre_shift)
+        return self.wide_magic_table.get((magic, power))
+
     def _handle_as_signed(self, magic, power,
                           sequence: List[Instruction], original_constants: Dict[str, str]):
-        result = self.signed_magic_table.get((magic, power))
+        result = self.perturbation_signed_magic_table.get((magic, power))
 
         if not result:
-            result = self.magic_table.get((magic, power + 3))
+            result = self.perturbation_magic_table.get((magic, power + 3))
         if not result:
             for i in range(50):
-                result = self.magic_table.get((magic - i, power + 3))
+                result = self.perturbation_magic_table.get((magic - i, power + 3))
                 if result:
                     break
         if not result:
@@ -138,7 +169,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
 
         return magic, first_mul_index
 
@@ -148,7 +179,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             if x.mnemonic == 'shr':
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
         return power
 
     def _backtrack_magic_number(self, imul_index: int, sequence: List[Instruction], original_constants: Dict[str, str],
@@ -177,7 +208,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             break
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -194,7 +225,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             break
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -222,14 +253,14 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
         if not shift_instr:
             return 0
 
-        shift = int(original_constants.get(shift_instr.operands[-1]), HEX_BASE)
+        shift = original_constants.value(shift_instr.operands[-1])
         power += shift
         if shift < 32:
 
             for i in range(50):
                 # 148 or 224
                 new_magic = magic * (2 ** shift) - i
-                result = self.signed_magic_table.get((new_magic, power))
+                result = self.perturbation_signed_magic_table.get((new_magic, power))
 
                 if result:
                     break
@@ -237,7 +268,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 # 152
                 for i in range(50):
                     new_magic = magic * (2 ** (shift - 1)) - i
-                    result = self.signed_magic_table.get((new_magic, power - 1))
+                    result = self.perturbation_signed_magic_table.get((new_magic, power - 1))
                     if result:
                         break
             if not result:
@@ -246,7 +277,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     new_magic = magic * (2 ** (shift - 2)) - i
                     # ic(new_magic)
                     # ic(power-shift+1)
-                    result = self.signed_magic_table.get((new_magic, power - shift + 1))
+                    result = self.perturbation_signed_magic_table.get((new_magic, power - shift + 1))
                     if result:
                         break
             if not result:
@@ -255,20 +286,20 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                     new_magic = magic * (2 ** (shift + 2)) - i
                     # ic(new_magic)
                     # ic(power+shift)
-                    result = self.signed_magic_table.get((new_magic, power + shift))
+                    result = self.perturbation_signed_magic_table.get((new_magic, power + shift))
                     if result:
                         break
 
         if not result:
             new_magic = magic * (2 ** (shift + 1)) - 1
-            result = self.signed_magic_table.get((new_magic, power + 1))
+            result = self.perturbation_signed_magic_table.get((new_magic, power + 1))
 
         if not result:
             # 280
             for i in range(8):
                 new_magic = magic * (2 ** (shift + 1)) - i
 
-                result = self.signed_magic_table.get((new_magic, power + shift - 2))
+                result = self.perturbation_signed_magic_table.get((new_magic, power + shift - 2))
                 if result:
                     break
 
@@ -280,7 +311,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 # ic(new_magic)
                 # ic(power + shift - 3)
 
-                result = self.signed_magic_table.get((new_magic, power + shift - 3))
+                result = self.perturbation_signed_magic_table.get((new_magic, power + shift - 3))
                 if result:
                     break
 
@@ -289,7 +320,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             for i in range(12):
                 new_magic = magic * 4 - i
                 # ic(new_magic)
-                result = self.signed_magic_table.get((new_magic, power - shift + 2))
+                result = self.perturbation_signed_magic_table.get((new_magic, power - shift + 2))
                 if result:
                     break
 
@@ -297,7 +328,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             # 336
             for i in range(3):
                 new_magic = magic * (2) - i
-                result = self.signed_magic_table.get((new_magic, power - shift + 1))
+                result = self.perturbation_signed_magic_table.get((new_magic, power - shift + 1))
                 if result:
                     break
 
@@ -305,7 +336,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
             # 584
             for i in range(20):
                 new_magic = magic * (2 ** (shift + 2)) - i
-                result = self.signed_magic_table.get((new_magic, power + shift - 1))
+                result = self.perturbation_signed_magic_table.get((new_magic, power + shift - 1))
                 if result:
                     break
 
@@ -315,7 +346,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 new_magic = magic * (2 ** (shift - 2)) - i
                 # ic(new_magic)
                 # ic(power-shift+3)
-                result = self.signed_magic_table.get((new_magic, power - shift + 3))
+                result = self.perturbation_signed_magic_table.get((new_magic, power - shift + 3))
                 if result:
                     break
 
@@ -325,7 +356,7 @@ class UnsignedDivisionInstructionSequence(InstructionSequence):
                 new_magic = magic * (2 ** (shift - 3)) - i
                 # ic(new_magic)
                 # ic(power-shift+3)
-                result = self.signed_magic_table.get((new_magic, power - shift + 3))
+                result = self.perturbation_signed_magic_table.get((new_magic, power - shift + 3))
                 if result:
                     break
 
@@ -4,19 +4,18 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.registry import signed_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
 
 # ic.disable()
 class SignedModuloInstructionSequence(InstructionSequence):
     def __init__(self):
         sequences = load_pattern_sequences_for_operation("mods")
-        self.magic_table = compute_magic_numbers_if_not_exists()
+        self.magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -24,8 +23,9 @@ class SignedModuloInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             ic()
             match.operation = "modulo"
             match.operand = self._get_register_operand(original_registers)
@@ -72,7 +72,7 @@ class SignedModuloInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        match.constant = int(original_constants.get(constant), HEX_BASE) + 1
+        match.constant = original_constants.value(constant) + 1
         return match
 
     def handle_magic_numbers_modulo(
@@ -114,7 +114,7 @@ class SignedModuloInstructionSequence(InstructionSequence):
                 ic(imul)
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                         ic(magic)
                         break
                 break
@@ -141,11 +141,11 @@ class SignedModuloInstructionSequence(InstructionSequence):
                         ic(current)
 
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
             ic(magic)
 
@@ -155,7 +155,7 @@ class SignedModuloInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val >= 32 and not power:
                             power = val
                             power_instr = instr
@@ -167,9 +167,9 @@ class SignedModuloInstructionSequence(InstructionSequence):
             if instr.mnemonic in {'sar', 'shr'}:
                 for op in instr.operands:
                     if op.startswith("const"):
-                        val = int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
                         if val < 0x1f and not extra:
-                            extra = int(original_constants.get(op), HEX_BASE)
+                            extra = original_constants.value(op)
                             break
 
         # magic = int(original_constants.get("const_0"), HEX_BASE)
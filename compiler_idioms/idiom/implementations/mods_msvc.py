@@ -4,14 +4,13 @@ from typing import List, Dict, Tuple
 
 from icecream import ic
 
-from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence, SIGNED_TYPES, UNSIGNED_TYPES
+from compiler_idioms.idiom.registry import signed_magic_table, idiom_sequences
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
 # ic.disable()
 
 
@@ -23,17 +22,23 @@ class SignedModuloInstructionSequence(InstructionSequence):
     def __init__(self):
         self.abbrev_operation_name = "mods"
         self.operation_name = "modulo"
-        sequences = load_pattern_sequences_for_operation(self.abbrev_operation_name)
-        self.magic_table = compute_magic_numbers_if_not_exists()
-        super().__init__(sequences)
+        self.magic_table = signed_magic_table()
+        # per operation width, 64 for the movabs/imul r64 sequences of long long divisions on x64
+        self.magic_tables = {32: self.magic_table, 64: signed_magic_table(bits=64)}
+        super().__init__(idiom_sequences(type(self)))
+
+    @classmethod
+    def load_sequences(cls) -> List[List[Instruction]]:
+        return load_pattern_sequences_for_operation("mods")
 
     def search(
             self,
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -66,8 +71,9 @@ class SignedModuloInstructionSequence(InstructionSequence):
         return match
 
     def handle_patterns_with_div(self, match, original_constants, sequence, original_registers):
-        const = int(original_constants['const_0'], HEX_BASE)
-        original_constant = ctypes.c_int32(const).value
+        const = original_constants.value('const_0')
+        width = self._operation_width(sequence[:match.length], original_registers)
+        original_constant = SIGNED_TYPES[width](const).value
         # if original_constant < 0:
         #     original_constant = -original_constant
         match.constant = original_constant
@@ -86,7 +92,7 @@ class SignedModuloInstructionSequence(InstructionSequence):
             next_after_div = sequence[len(match.sequence)]
             if next_after_div.mnemonic == 'mov':
                 source = next_after_div.operands[-1]
-                if source in original_registers and original_registers[source] == 'edx':
+                if source in original_registers and original_registers[source] in ('edx', 'rdx'):
                     return True
         return False
 
@@ -108,17 +114,17 @@ class SignedModuloInstructionSequence(InstructionSequence):
             for i in sequence:
                 if i.mnemonic == 'or' and self._is_constant(i.operands[-1]):
                     constant = i.operands[1]
-                    if ctypes.c_int32(int(original_constants.get(constant), HEX_BASE)).value > 0:
+                    if ctypes.c_int32(original_constants.value(constant)).value > 0:
                         continue
 
-                    match.constant = -(ctypes.c_int32(int(original_constants.get(constant), HEX_BASE)).value)
+                    match.constant = -(ctypes.c_int32(original_constants.value(constant)).value)
                     ic()
                     ic(match.constant)
                     return match
             for i in sequence:
                 if i.mnemonic == "and":
                     constant = i.operands[1]
-                    match.constant = int(original_constants.get(constant), HEX_BASE) + 1
+                    match.constant = original_constants.value(constant) + 1
                     break
             if not constant:
                 match.constant = None
@@ -133,37 +139,42 @@ class SignedModuloInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
     ):
         match.constant = None
-        match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence)
+        width = self._operation_width(sequence[:match.length], original_registers)
+        match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence,
+                                                                width)
         return match
 
     def _get_register_operand(self, original_registers: Dict[str, str]):
         return original_registers.get("reg_1", [])
 
     def _get_original_constant_from_magic(
-            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
+            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction],
+            width: int = 32
     ) -> int:
         magic, imul_index = self._get_mul_constant_and_position(sequence, original_constants)
-        if not magic:
+        if not magic and width == 64:
+            magic = self._backtrack_wide_magic_number(sequence, original_constants, original_registers)
+        elif not magic:
             magic = self._backtrack_magic_number(imul_index, sequence, original_constants, original_registers)
-        power = self._accumulate_shift_amount(sequence, original_constants)
-        quotient = self._lookup(magic, power)
-        if ctypes.c_int32(magic).value < 0 and not quotient:
+        power = self._accumulate_shift_amount(sequence, original_constants, width)
+        quotient = self._lookup(magic, power, width)
+        if SIGNED_TYPES[width](magic).value < 0 and not quotient:
             # case 7
-            unsigned_magic = ctypes.c_uint32(magic).value
-            quotient = self._lookup(unsigned_magic, power)
+            unsigned_magic = UNSIGNED_TYPES[width](magic).value
+            quotient = self._lookup(unsigned_magic, power, width)
             if not quotient:
-                negative_magic = ctypes.c_int32(magic).value
-                quotient = self._lookup(negative_magic, power)
+                negative_magic = SIGNED_TYPES[width](magic).value
+                quotient = self._lookup(negative_magic, power, width)
         return quotient
 
-    def _lookup(self, magic: int, power: int) -> int:
-        quotient = self._search_magic_table(magic, power)
+    def _lookup(self, magic: int, power: int, width: int = 32) -> int:
+        quotient = self._search_magic_table(magic, power, width)
         if not quotient:
-            quotient = self._search_magic_table(magic, power + 32)
+            quotient = self._search_magic_table(magic, power + width, width)
         return quotient
 
-    def _search_magic_table(self, magic: int, power: int) -> int:
-        quotient = self.magic_table.get((magic, power))
+    def _search_magic_table(self, magic: int, power: int, width: int = 32) -> int:
+        quotient = self.magic_tables[width].get((magic, power))
         return quotient
 
     def _get_mul_constant_and_position(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> Tuple[
@@ -175,20 +186,21 @@ class SignedModuloInstructionSequence(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if self._is_constant(op):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                         return magic, first_mul_index
                 return 0, first_mul_index
         return magic, first_mul_index
 
-    def _accumulate_shift_amount(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> int:
+    def _accumulate_shift_amount(self, sequence: List[Instruction], original_constants: Dict[str, str],
+                                 width: int = 32) -> int:
         result = 0
         for instr in sequence:
             if instr.mnemonic in self.RIGHT_SHIFT:
                 for op in instr.operands:
                     if self._is_constant(op):
-                        val = int(original_constants.get(op), HEX_BASE)
-                        if val != 0x1f:
-                            result += int(original_constants.get(op), HEX_BASE)
+                        val = original_constants.value(op)
+                        if val != width - 1:
+                            result += original_constants.value(op)
         return result
 
     def _backtrack_magic_number(self, imul_index: int, sequence: List[Instruction], original_constants: Dict[str, str],
@@ -216,7 +228,7 @@ class SignedModuloInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if self._is_constant(current_instr.operands[-1]):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             return magic_number
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -4,16 +4,13 @@ from typing import List, Dict, Tuple
 
 from icecream import ic
 
-from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence, UNSIGNED_TYPES
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table, idiom_sequences
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
-
 
 ic.disable()
 class UnsignedModuloInstructionSequence(InstructionSequence):
@@ -21,6 +18,14 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
     DIV = {'div', 'idiv'}
 
     def __init__(self):
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
+        # movabs/mul r64 sequences of unsigned long long modulo on x64
+        self.wide_magic_table = unsigned_magic_table(bits=64)
+        super().__init__(idiom_sequences(type(self)))
+
+    @classmethod
+    def load_sequences(cls) -> List[List[Instruction]]:
         sequences = load_pattern_sequences_for_operation("modu")
         sequences.append([Instruction(address=4548, mnemonic='mov', operands=('reg_0', 'reg_1'), matched=False),
                           Instruction(address=4550, mnemonic='mov', operands=('reg_2', 'reg_1'), matched=False),
@@ -32,18 +37,16 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                                       matched=False),
                           Instruction(address=4569, mnemonic='sub', operands=('reg_2', 'reg_0'), matched=False),
                           Instruction(address=4571, mnemonic='ret', operands=(), matched=False)])
-
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
-        super().__init__(sequences)
+        return sequences
 
     def search(
             self,
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -71,8 +74,9 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
         return self._handle_unsigned_magic_numbers_division(match, original_constants, original_registers, sequence)
 
     def handle_patterns_with_div(self, match, original_constants, sequence, original_registers):
-        const = int(original_constants['const_0'], HEX_BASE)
-        original_constant = ctypes.c_int32(const).value
+        const = original_constants.value('const_0')
+        width = self._operation_width(sequence[:match.length], original_registers)
+        original_constant = ctypes.c_int32(const).value if width == 32 else UNSIGNED_TYPES[width](const).value
         match.constant = original_constant
         if match.sequence[-1].mnemonic in self.DIV:
             if self._remainder_register_is_copied_after_div(match, sequence, original_registers):
@@ -87,7 +91,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             next_after_div = sequence[len(match.sequence)]
             if next_after_div.mnemonic == 'mov':
                 source = next_after_div.operands[-1]
-                if source in original_registers and original_registers[source] == 'edx':
+                if source in original_registers and original_registers[source] in ('edx', 'rdx'):
                     return True
         return False
 
@@ -108,7 +112,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             if i.mnemonic == "and":
                 last_op = i.operands[1]
                 if self._is_constant(last_op):
-                    match.constant = 1 + int(original_constants.get(last_op), HEX_BASE)
+                    match.constant = 1 + original_constants.value(last_op)
                     return match
 
         return None
@@ -120,6 +124,10 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             original_registers: Dict[str, str],
             sequence: List[Instruction],
     ):
+        if self._operation_width(sequence[:match.length], original_registers) == 64:
+            match.constant = self._get_original_constant_from_wide_magic(original_constants, original_registers,
+                                                                         sequence[:match.length])
+            return match
         match.constant = self._get_original_constant_from_magic(original_constants, original_registers, sequence)
         return match
 
@@ -138,6 +146,24 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             result = self.magic_table.get((magic, power + 32))
         return result
 
+    def _get_original_constant_from_wide_magic(
+            self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
+    ) -> int:
+        """
+        64-bit modulo, the quotient is computed as by UnsignedDivisionInstructionSequence: only shifts before the
+        one operand mul belong to an even divisor, all after it to the magic number
+        """
+        result = self._try_imul_cheating(original_constants, original_registers, sequence)
+        if result:
+            return result
+        magic = self._backtrack_wide_magic_number(sequence, original_constants, original_registers)
+        mul_position = next(i for i, instr in enumerate(sequence) if instr.mnemonic in self.MUL)
+        pre_shift = self._accumulate_shr_amount(sequence[:mul_position], original_constants)
+        power = self._accumulate_shr_amount(sequence[mul_position:], original_constants) + 64
+        if pre_shift:
+            return self.wide_magic_table.get_pre_shifted((magic, power), pre_shift)
+        return self.wide_magic_table.get((magic, power))
+
     def _get_register_operand(self, original_registers: Dict[str, str]):
         return original_registers.get("reg_1", [])
 
@@ -155,7 +181,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             cheat_imul = sequence[second_imul_index]
             last_op = cheat_imul.operands[-1]
             if last_op.startswith("const"):
-                return int(original_constants.get(last_op), HEX_BASE)
+                return original_constants.value(last_op)
 
     def _accumulate_shr_amount(self, sequence: List[Instruction], original_constants: Dict[str, str]) -> int:
         power = 0
@@ -164,7 +190,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                 ic(x)
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
                         ic(power)
         return power
 
@@ -195,7 +221,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
 
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             break
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -212,7 +238,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                     destination_register = original_registers.get(destination)
                     if destination_register == register or destination_register.endswith(lower):
                         if current_instr.operands[-1].startswith("const"):
-                            magic_number = int(original_constants.get(current_instr.operands[-1]), HEX_BASE)
+                            magic_number = original_constants.value(current_instr.operands[-1])
                             break
                         else:
                             register = original_registers.get(current_instr.operands[-1])
@@ -234,7 +260,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                 first_mul_index = i
                 for op in instr.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
         return magic, first_mul_index
 
     @staticmethod
@@ -5,14 +5,12 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic_unsigend import compute_magic_numbers_if_not_exists as magic_unsigned
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists as magic
+from compiler_idioms.idiom.registry import signed_magic_table, unsigned_magic_table
 from compiler_idioms.idiom.utils.pattern_utils import load_pattern_sequences_for_operation
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import ROOT
 
-HEX_BASE = 16
 
 #ic.disable()
 class UnsignedModuloInstructionSequence(InstructionSequence):
@@ -29,8 +27,8 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                           Instruction(address=4569, mnemonic='sub', operands=('reg_2', 'reg_0'), matched=False),
                           Instruction(address=4571, mnemonic='ret', operands=(), matched=False)])
 
-        self.magic_table = magic_unsigned()
-        self.signed_magic_table = magic()
+        self.magic_table = unsigned_magic_table()
+        self.signed_magic_table = signed_magic_table()
         super().__init__(sequences)
 
     def search(
@@ -38,8 +36,9 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             sequence: List[Instruction],
             original_constants: Dict[str, str],
             original_registers: Dict[str, str],
+            candidates: List[int] = None,
     ) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             return self.handle_match(
                 match, original_constants, original_registers, sequence
             )
@@ -82,7 +81,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
         if not constant:
             match.constant = None
             return match
-        match.constant = 1 + int(original_constants.get(constant), HEX_BASE)
+        match.constant = 1 + original_constants.value(constant)
         return match
 
     def handle_magic_numbers_division(
@@ -112,7 +111,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
             cheat_imul = sequence[second_imul_index]
             last_op = cheat_imul.operands[-1]
             if last_op.startswith("const"):
-                return int(original_constants.get(last_op), HEX_BASE)
+                return original_constants.value(last_op)
 
     def _get_original_constant_from_magic(
             self, original_constants: Dict[str, str], original_registers: Dict[str, str], sequence: List[Instruction]
@@ -132,14 +131,14 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                 break
         if first_shift:
             return self._handle_as_signed(original_constants, original_registers, sequence)
-        magic = int(original_constants.get("const_0"), HEX_BASE)
+        magic = original_constants.value("const_0")
         # power = int(original_constants.get("const_1"), HEX_BASE)
         power = 0
         for x in sequence:
             if x.mnemonic == 'shr':
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
 
         result =  self.magic_table.get((magic, power))
         if not result:
@@ -156,7 +155,7 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                 imul_index = i
                 for op in x.operands:
                     if op.startswith("const"):
-                        magic = int(original_constants.get(op), HEX_BASE)
+                        magic = original_constants.value(op)
                 break
         imul = sequence[imul_index]
 
@@ -174,17 +173,17 @@ class UnsignedModuloInstructionSequence(InstructionSequence):
                     register = original_registers[current.operands[0]]
                     if register == original_register0 or register.endswith(lower0):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
                     elif register == original_register1 or register.endswith(lower1):
                         if current.operands[-1].startswith("const"):
-                            magic = int(original_constants.get(current.operands[-1]), HEX_BASE)
+                            magic = original_constants.value(current.operands[-1])
                             break
         for x in sequence:
             if x.mnemonic == 'shr':
                 for op in x.operands:
                     if op.startswith("const"):
-                        power += int(original_constants.get(op), HEX_BASE)
+                        power += original_constants.value(op)
 
         result = self.signed_magic_table.get((magic, power))
 
@@ -1,12 +1,14 @@
 from typing import List, Dict
 import logging
 import ctypes
-import yaml
 
 logger = logging.getLogger('yaml')
 logger.setLevel(level=logging.ERROR)
 
+from compiler_idioms.anonymization import OriginalConstants
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+from compiler_idioms.idiom.registry import idiom_sequences
+from compiler_idioms.idiom.utils.pattern_database import load_pattern_database
 from compiler_idioms.instruction import Instruction
 from compiler_idioms.match import Match
 from safe_eval import safe_eval
@@ -18,47 +20,32 @@ TEST_PATTERN_PATH = PATTERNS_DIR / "patterns-mul.yaml"
 class SignedMultiplicationInstructionSequence(InstructionSequence):
 
     def __init__(self):
-        sequences, constants = self._load_sequences_from_file()  # TODO: might make sense to move this to parent class
-        super().__init__(sequences)
-        self._constant_calculations = constants
+        super().__init__(idiom_sequences(type(self)))
+        # TEST_PATTERN_PATH, compiled into the pattern database, metadata[i] belongs to the i-th sequence
+        self._constant_calculations = load_pattern_database().idioms["mul"].metadata
 
-    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str]) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+    @classmethod
+    def load_sequences(cls) -> List[List[Instruction]]:
+        return list(load_pattern_database().idioms["mul"].sequences)
+
+    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str],
+               candidates: List[int] = None) -> Match:
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             match.operation = "multiplication"
             match.operand = self._get_register_operand(original_registers)
             match.constant = self._get_original_constant(sequence, original_constants)
             return match
 
-    def _load_sequences_from_file(self) -> (List[List[Instruction]], List[str]):
-        result = []
-        constants = []
-        with open(TEST_PATTERN_PATH) as f:
-            for obj in yaml.load_all(f, Loader=yaml.FullLoader):
-                for idiom_sequence in obj:
-                    result.append(self._str_list_to_instr_list(idiom_sequence["pattern"]))
-                    constants.append(idiom_sequence["constant"])
-        return result, constants
-
     def _get_register_operand(self, original_registers: Dict[str, str]) -> str:
         return original_registers.get("reg_0", [])
 
-    def _get_original_constant(self, sequence, original_constants: Dict[str, str]) -> int:
+    def _get_original_constant(self, sequence, original_constants: OriginalConstants) -> int:
         original_constants = {
-            name: self._get_constant_value(value)
-            for name, value in original_constants.items()
+            name: self._get_constant_value(original_constants.value(name))
+            for name in original_constants
         }
         return safe_eval(self._constant_calculations[self._last_matched_index], original_constants)
 
-    def _get_constant_value(self, value):
-        if value.startswith("-"): return int(value, 16)
-        return ctypes.c_int(int(value, 16)).value
-
-    def _str_list_to_instr_list(self, str_list: List[str]) -> List[Instruction]:
-        return [
-            Instruction(
-                address=-1,
-                mnemonic=(mnemonic := s.split(" ")[0]),
-                operands=tuple(map(lambda x: x.strip(), s[len(mnemonic):].split(",")))
-            )
-            for s in str_list
-        ]
+    def _get_constant_value(self, value: int) -> int:
+        if value < 0: return value
+        return ctypes.c_int(value).value
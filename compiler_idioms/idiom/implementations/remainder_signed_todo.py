@@ -4,7 +4,7 @@ from typing import List, Dict
 from icecream import ic
 
 from compiler_idioms.idiom.instruction_sequence import InstructionSequence
-from compiler_idioms.idiom.utils.magic import compute_magic_numbers_if_not_exists
+from compiler_idioms.idiom.registry import signed_magic_table
 from compiler_idioms.instruction import from_anonymized_pattern, Instruction
 from compiler_idioms.match import Match
 from config import TEST_DIR, ROOT
@@ -13,8 +13,6 @@ from config import TEST_DIR, ROOT
 TEST_PATTERN_PATH = TEST_DIR / "patterns-mods-O0.json"
 PATTERN_DIR = ROOT / 'patterns'
 
-HEX_BASE = 16
-
 
 class SignedRemainderInstructionSequence(InstructionSequence):
     def __init__(self):
@@ -23,11 +21,12 @@ class SignedRemainderInstructionSequence(InstructionSequence):
         #     seq = json.load(f)
         # print(seq)
         # sequences = [from_anonymized_pattern(seq['pattern'])]
-        self.magic_table = compute_magic_numbers_if_not_exists()
+        self.magic_table = signed_magic_table()
         super().__init__(sequences)
 
-    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str]) -> Match:
-        if match := super().search(sequence, original_constants, original_registers):
+    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str],
+               candidates: List[int] = None) -> Match:
+        if match := super().search(sequence, original_constants, original_registers, candidates):
             match.operation = "modulo"
             match.operand = self._get_register_operand(original_registers)
             match.constant = self._get_original_constant_from_magic(original_constants)
@@ -39,8 +38,8 @@ class SignedRemainderInstructionSequence(InstructionSequence):
         return original_registers.get("reg_1", [])
 
     def _get_original_constant_from_magic(self, original_constants: Dict[str, str]) -> int:
-        magic = int(original_constants.get("const_0"), HEX_BASE)
-        power = int(original_constants.get("const_1"), HEX_BASE) + int(original_constants.get("const_2"), HEX_BASE)
+        magic = original_constants.value("const_0")
+        power = original_constants.value("const_1") + original_constants.value("const_2")
         return self.magic_table.get((magic, power))
 
     @staticmethod
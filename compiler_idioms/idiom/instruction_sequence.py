@@ -1,12 +1,24 @@
+import ctypes
+from collections import defaultdict
 from typing import List, Dict
 
 from icecream import ic
 
+from compiler_idioms.anonymization import EncodedInstruction
 from compiler_idioms.idiom.idiom import Idiom
+from compiler_idioms.idiom.utils.pattern_database import encode_pattern
 from compiler_idioms.instruction import Instruction
 from compiler_idioms.match import Match
+from compiler_idioms.registers import lookup_register, same_family
 
 SHIFTS = {'sar', 'sal', 'shl', 'shr'}
+# movabs loads the 64-bit magic numbers
+MOVES = {'mov', 'movabs'}
+# with a single operand, these work on edx:eax or rdx:rax, i.e. the width of their operand is the width of the operation
+WIDENING = {'mul', 'imul', 'div', 'idiv'}
+# the integer types of an operation width, as reinterpreted by ctypes
+SIGNED_TYPES = {32: ctypes.c_int32, 64: ctypes.c_int64}
+UNSIGNED_TYPES = {32: ctypes.c_uint32, 64: ctypes.c_uint64}
 
 
 class InstructionSequence(Idiom):
@@ -18,34 +30,115 @@ class InstructionSequence(Idiom):
         """
         self.__sequences = sequences
         self._last_matched_index = 0
+        # we need to order the sequences from long to short to ensure that no incomplete idiom is matched.
+        # The order is stable, i.e. sequences of the same length keep their order.
+        self._longest_first = sorted(range(len(sequences)), key=lambda i: len(sequences[i]), reverse=True)
+        self._rank = {i: rank for rank, i in enumerate(self._longest_first)}
+        self._first_instructions = self._index_first_instructions(sequences, self._longest_first)
 
     def matches_first_instruction(self, instruction: Instruction) -> bool:
-        return any(self._equal(instruction, idiom_seq[0]) for idiom_seq in self.__sequences)
+        return self._key(instruction) in self._first_instructions
 
-    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str]) -> Match:
-        # we need to order the sequences from long to short to ensure that no incomplete idiom is matched.
+    def sequences_starting_with(self, instruction: Instruction) -> List[int]:
+        """
+        Returns the indices of all idiom-sequences whose first instruction equals the given (anonymized) instruction.
+        """
+        return self._first_instructions.get(self._key(instruction), [])
+
+    @classmethod
+    def _index_first_instructions(cls, sequences: List[List[Instruction]], order: List[int]) -> Dict[
+        int, List[int]]:
+        """
+        Hash index from the first instruction of the idiom-sequences to their indices in the given order
+        """
+        first_instructions = defaultdict(list)
+        for i in order:
+            if idiom_seq := sequences[i]:
+                first_instructions[idiom_seq[0].intern_key()].append(i)
+        return dict(first_instructions)
+
+    @property
+    def sequences(self) -> List[List[Instruction]]:
+        return self.__sequences
+
+    @property
+    def encoded_sequences(self) -> List[List[EncodedInstruction]]:
+        """
+        The prev-encodings of the idiom-sequences, see encode_pattern
+        """
+        return [encode_pattern(sequence) for sequence in self.__sequences]
 
-        # Do not remove before we match all operations
-        # one-liner is a hell for debugging
-        for i, idiom_seq in sorted(enumerate(self.__sequences), key=lambda x: len(x[1]), reverse=True):
-            if len(sequence) >= len(idiom_seq):
-                paars = [(idiom_instr, sequence_instr) for idiom_instr, sequence_instr in zip(idiom_seq, sequence[:len(idiom_seq)])]
-                # if sequence[0].address == 4560:
-                #     if len(idiom_seq) > 4 and idiom_seq[2].mnemonic == 'imul' and idiom_seq[0].mnemonic == 'mov' and idiom_seq[3].mnemonic == 'sar':
-                #         ic(paars)
-
-
-                if all([self._equal(x, y, original_constants) for x, y in paars]):
-                    # ic()
-                    # ic('KKKKKKKKKKKKKKKKKKKKKKKKKKKKKKKKK')
-                    # ic(hex(sequence[0].address))
-                    self._last_matched_index = i
-                    return Match(address=sequence[0].address, length=len(idiom_seq),sequence=idiom_seq)
-            # if len(sequence) >= len(idiom_seq) and all(self._equal(idiom_instr, sequence_instr) for idiom_instr, sequence_instr in zip(idiom_seq, sequence[:len(idiom_seq)])):
-            #     return Match(address=sequence[0].address, length=len(idiom_seq))
+    def search(self, sequence: List[Instruction], original_constants: Dict[str, str], original_registers: Dict[str, str],
+               candidates: List[int] = None) -> Match:
+        if candidates is None:
+            if not sequence:
+                return None
+            # only sequences with the same first instruction can match, already ordered from long to short
+            candidates = self.sequences_starting_with(sequence[0])
+        else:
+            # e.g. found by the prefix tree of the matcher, still verified below
+            candidates = sorted(candidates, key=self._rank.__getitem__)
+
+        for i in candidates:
+            idiom_seq = self.__sequences[i]
+            if len(idiom_seq) > len(sequence):
+                continue
+            if self._matches(idiom_seq, sequence, original_constants):
+                self._last_matched_index = i
+                return Match(address=sequence[0].address, length=len(idiom_seq), sequence=idiom_seq)
+
+    def _matches(self, idiom_seq: List[Instruction], sequence: List[Instruction],
+                 original_constants: Dict[str, str] = None) -> bool:
+        """
+        Compares the idiom-sequence with the beginning of the sequence, stops at the first mismatch.
+        """
+        for idiom_instr, sequence_instr in zip(idiom_seq, sequence):
+            if not self._equal(idiom_instr, sequence_instr, original_constants):
+                return False
+        return True
 
     def _equal(self, idiom_seq_instruction: Instruction, instruction: Instruction, original_constants: Dict[str, str] = None) -> bool:
         """
         We ignore the address of instruction when comparing with idiom instruction that has address -1
         """
-        return (instruction.mnemonic, instruction.operands) == (idiom_seq_instruction.mnemonic, idiom_seq_instruction.operands)
+        return instruction.key == idiom_seq_instruction.intern_key()
+
+    @staticmethod
+    def _key(instruction: Instruction) -> int:
+        return instruction.key
+
+    @staticmethod
+    def _operation_width(sequence: List[Instruction], original_registers: Dict[str, str]) -> int:
+        """
+        64 if a one operand mul, imul, div or idiv of the sequence has a 64-bit register as operand (e.g. the 128-bit
+        product of movabs rax, magic; imul rdi), otherwise 32.
+        Multiplications with more operands do not count: imul rax, rax, magic is used for 32-bit divisions on x64.
+        """
+        for instr in sequence:
+            if instr.mnemonic in WIDENING and len(instr.operands) == 1:
+                register = lookup_register(original_registers.get(instr.operands[0], ""))
+                if register and register.width == 64:
+                    return 64
+        return 32
+
+    @staticmethod
+    def _backtrack_wide_magic_number(sequence: List[Instruction], original_constants: Dict[str, str],
+                                     original_registers: Dict[str, str]) -> int:
+        """
+        The magic number of the first one operand mul or imul: the last constant moved before it to its operand or to
+        rax, e.g. movabs rax, magic; imul rdi or movabs rdx, magic; mov rax, rcx; imul rdx
+        """
+        for mul_index, mul_instr in enumerate(sequence):
+            if mul_instr.mnemonic in {'mul', 'imul'} and len(mul_instr.operands) == 1:
+                break
+        else:
+            return 0
+        factors = ['rax', original_registers.get(mul_instr.operands[0], "")]
+        for i in range(mul_index - 1, -1, -1):
+            current_instr = sequence[i]
+            if current_instr.mnemonic not in MOVES or not current_instr.operands[-1].startswith("const"):
+                continue
+            destination = original_registers.get(current_instr.operands[0], "")
+            if any(same_family(destination, factor) for factor in factors):
+                return original_constants.value(current_instr.operands[-1])
+        return 0
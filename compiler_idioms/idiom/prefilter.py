@@ -0,0 +1,45 @@
+from collections import Counter
+from typing import List, Tuple
+
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+from compiler_idioms.instruction import Instruction
+
+# mnemonics with their minimal number of occurrences, e.g. (('imul', 1), ('sar', 2), ('sub', 1))
+MnemonicMultiset = Tuple[Tuple[str, int], ...]
+
+
+class MnemonicPrefilter:
+    """
+    Rejects functions that cannot contain any idiom sequence, before they are anonymized.
+
+    Every idiom sequence needs its mnemonics (with multiplicity) somewhere in a function. The multisets are derived
+    from the loaded idioms, so the filter follows the pattern database. Multisets containing another one are
+    dropped, since every function satisfying them also satisfies the smaller one.
+    """
+
+    def __init__(self, multisets: List[MnemonicMultiset]):
+        self.multisets = self._minimize(multisets)
+        self.mnemonics = {mnemonic for multiset in self.multisets for mnemonic, _ in multiset}
+
+    @classmethod
+    def from_idioms(cls, idioms: List[InstructionSequence]) -> "MnemonicPrefilter":
+        return cls([
+            tuple(sorted(Counter(instr.mnemonic for instr in sequence).items()))
+            for idiom in idioms
+            for sequence in idiom.sequences
+            if sequence
+        ])
+
+    @staticmethod
+    def _minimize(multisets: List[MnemonicMultiset]) -> List[MnemonicMultiset]:
+        minimal = []
+        # a multiset can only contain smaller ones
+        for multiset in sorted(set(multisets), key=lambda m: (sum(count for _, count in m), m)):
+            if not any(all(dict(multiset).get(mnemonic, 0) >= count for mnemonic, count in smaller)
+                       for smaller in minimal):
+                minimal.append(multiset)
+        return minimal
+
+    def may_match(self, function: List[Instruction]) -> bool:
+        histogram = Counter(instr.mnemonic for instr in function if instr.mnemonic in self.mnemonics)
+        return any(all(histogram[mnemonic] >= count for mnemonic, count in multiset) for multiset in self.multisets)
@@ -0,0 +1,88 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Tuple, Optional, Iterable, Hashable
+
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+
+
+@dataclass
+class PrefixTreeNode:
+    """
+    children: next instructions, keyed by their prev-encoding (skeleton, distances)
+    patterns: idiom sequences ending in this node as (idiom index, sequence index)
+    height: length of the longest path to a leaf, i.e. how many more instructions a match can have
+    """
+    children: Dict[Hashable, "PrefixTreeNode"] = field(default_factory=dict)
+    patterns: List[Tuple[int, int]] = field(default_factory=list)
+    height: int = 0
+
+
+class PrefixTree:
+    """
+    Prefix tree over the anonymized instruction sequences of all idioms.
+    The tree is keyed by the prev-encoding of the sequences, so that any window of a prev-encoded function
+    can be looked up without anonymizing it (see window_prev_encoding).
+
+    Instead of comparing a candidate sequence with every pattern of every idiom one at a time, we walk the tree
+    once along the candidate sequence. The cost of a lookup only depends on the length of the candidate sequence,
+    not on the size of the pattern database.
+    """
+
+    def __init__(self):
+        self.root = PrefixTreeNode()
+        self.size = 0
+
+    @classmethod
+    def from_idioms(cls, idioms: List[InstructionSequence]) -> "PrefixTree":
+        tree = cls()
+        for idiom_index, idiom in enumerate(idioms):
+            for sequence_index, encoded_sequence in enumerate(idiom.encoded_sequences):
+                keys = [(encoded.skeleton, encoded.distances) for encoded in encoded_sequence]
+                tree.insert(keys, idiom_index, sequence_index)
+        return tree
+
+    def insert(self, keys: List[Hashable], idiom_index: int, sequence_index: int) -> None:
+        if not keys:
+            return
+        node = self.root
+        for depth, key in enumerate(keys):
+            node.height = max(node.height, len(keys) - depth)
+            node = node.children.setdefault(key, PrefixTreeNode())
+        node.patterns.append((idiom_index, sequence_index))
+        self.size += 1
+
+    @property
+    def height(self) -> int:
+        """
+        Length of the longest idiom sequence
+        """
+        return self.root.height
+
+    def search(self, keys: Iterable[Hashable]) -> List[Tuple[int, int, int]]:
+        """
+        Walks the tree along the given (lazily) encoded sequence, as long as a longer idiom sequence can match.
+        :return: all idiom sequences matching the beginning of the sequence as (idiom index, sequence index, length),
+                 longest first and in insertion order for the same length
+        """
+        matched_nodes = []
+        node = self.root
+        for key in keys:
+            node = node.children.get(key)
+            if node is None:
+                break
+            matched_nodes.append(node)
+            # do not encode any more instructions, no idiom sequence is longer
+            if not node.height:
+                break
+        return [
+            (idiom_index, sequence_index, length)
+            for length, node in reversed(list(enumerate(matched_nodes, 1)))
+            for idiom_index, sequence_index in node.patterns
+        ]
+
+    def longest_match(self, keys: Iterable[Hashable]) -> Optional[Tuple[int, int, int]]:
+        """
+        :return: the longest idiom sequence matching the beginning of the sequence as
+                 (idiom index, sequence index, length) or None
+        """
+        matches = self.search(keys)
+        return matches[0] if matches else None
@@ -0,0 +1,84 @@
+import functools
+from typing import List, Tuple, NamedTuple, Type, Optional
+
+from compiler_idioms.anonymization import EncodedInstruction
+from compiler_idioms.idiom.automata import SkeletonAutomaton
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+from compiler_idioms.idiom.prefilter import MnemonicPrefilter
+from compiler_idioms.idiom.prefix_tree import PrefixTree
+from compiler_idioms.idiom.utils.magic import SignedMagicDivisors
+from compiler_idioms.idiom.utils.magic_unsigend import UnsignedMagicDivisors
+from compiler_idioms.idiom.utils.pattern_database import encode_pattern
+from compiler_idioms.instruction import Instruction
+
+# Process-wide registry of the data the idioms and matchers only read: the magic tables, the idiom-sequences of every
+# idiom class and the indices built from them. Each is loaded on first use, once per process, and then shared by all
+# idiom instances and matchers (and inherited by forked workers if loaded before the fork, see preload).
+
+
+class IdiomPatternSet(NamedTuple):
+    """
+    The idiom-sequences of an idiom class with their prev-encodings, in the order of the sequence indices
+    """
+    sequences: Tuple[List[Instruction], ...]
+    encoded_sequences: Tuple[List[EncodedInstruction], ...]
+
+
+class IdiomIndex(NamedTuple):
+    """
+    The structures a matcher searches with, built over the idiom-sequences of its idiom classes (idiom index =
+    position of the class)
+    """
+    prefix_tree: PrefixTree
+    automaton: SkeletonAutomaton
+    prefilter: MnemonicPrefilter
+
+
+@functools.lru_cache(maxsize=None)
+def signed_magic_table(max_divisor: Optional[int] = None, bits: int = 32) -> SignedMagicDivisors:
+    """(magic, power) -> divisor for the signed divisors of bits-wide operands, computed on lookup"""
+    return SignedMagicDivisors(max_divisor, bits)
+
+
+@functools.lru_cache(maxsize=None)
+def unsigned_magic_table(max_divisor: Optional[int] = None, bits: int = 32) -> UnsignedMagicDivisors:
+    """(magic, power) -> divisor for the unsigned divisors of bits-wide operands, computed on lookup"""
+    return UnsignedMagicDivisors(max_divisor, bits)
+
+
+@functools.lru_cache(maxsize=None)
+def idiom_patterns(idiom_class: Type[InstructionSequence]) -> IdiomPatternSet:
+    """
+    :param idiom_class: class with a load_sequences() classmethod
+    """
+    sequences = tuple(idiom_class.load_sequences())
+    return IdiomPatternSet(sequences, tuple(encode_pattern(sequence) for sequence in sequences))
+
+
+def idiom_sequences(idiom_class: Type[InstructionSequence]) -> Tuple[List[Instruction], ...]:
+    """
+    The shared idiom-sequences of the class, to be passed to InstructionSequence.__init__ and never modified
+    """
+    return idiom_patterns(idiom_class).sequences
+
+
+@functools.lru_cache(maxsize=None)
+def idiom_index(idiom_classes: Tuple[Type[InstructionSequence], ...]) -> IdiomIndex:
+    """
+    Built without instantiating any of the idioms
+    """
+    patterns = [idiom_patterns(idiom_class) for idiom_class in idiom_classes]
+    return IdiomIndex(
+        PrefixTree.from_idioms(patterns),
+        SkeletonAutomaton.from_idioms(patterns),
+        MnemonicPrefilter.from_idioms(patterns),
+    )
+
+
+def preload(idiom_classes: Tuple[Type[InstructionSequence], ...]) -> None:
+    """
+    Loads everything a matcher over the idiom classes needs, e.g. in the parent process before forking workers.
+    """
+    idiom_index(idiom_classes)
+    signed_magic_table()
+    unsigned_magic_table()
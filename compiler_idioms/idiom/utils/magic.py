@@ -1,7 +1,7 @@
 import ctypes
 import json
 import pathlib
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Iterator, Optional
 
 from config import ROOT
 
@@ -58,6 +58,85 @@ def _compute_power_with_minimal_error(divisor: int) -> Tuple[int, float]:
     return power, error
 
 
+def _has_minimal_error(power: int, divisor: int, bits: int = DEFAULT_POWER) -> bool:
+    """The error criterion of _compute_power_with_minimal_error for bits-wide operands, in integer arithmetic"""
+    y = 2 ** power
+    return (divisor - y % divisor) * (2 ** (bits - 1) - 1) < y
+
+
+def _to_signed(value: int, bits: int = DEFAULT_POWER) -> int:
+    """ctypes.c_int32(value).value for 32 bits, ctypes.c_int64(value).value for 64"""
+    return (value + 2 ** (bits - 1)) % 2 ** bits - 2 ** (bits - 1)
+
+
+class SignedMagicDivisors:
+    """
+    The magic map for every signed divisor of bits-wide operands, without a table: (magic, power) -> divisor, where
+    negative divisors have the keys of _compute_magic_map. For 32 bits, this is the magic map of all divisors, for 64
+    bits the same computed for 64-bit operands (power from 64 on, the magic of 128-bit products).
+
+    The divisor is inverted from magic = ceil(2 ** power / divisor), i.e. it lies in [2 ** power / magic,
+    2 ** power / (magic - 1)), which holds at most a few integers for the powers that have the minimal error. Each of
+    them is verified exactly: power is the smallest one with the minimal error for it and the magic is recomputed.
+    If several divisors have the same key, the one written last to the magic map wins, as in the table.
+    """
+
+    def __init__(self, max_divisor: Optional[int] = None, bits: int = DEFAULT_POWER):
+        """
+        :param max_divisor: largest magnitude of the divisors, by default 2 ** (bits - 1)
+        :param bits: width of the operands, 32 or 64
+        """
+        self.bits = bits
+        self.max_divisor = max_divisor or 2 ** (bits - 1)
+
+    def get(self, key: Tuple[int, int], default: Optional[int] = None) -> Optional[int]:
+        magic, power = key
+        if not isinstance(magic, int) or not isinstance(power, int) or power < self.bits:
+            return default
+        # in the order of _compute_magic_map: ascending magnitude, the positive divisor before the negative one
+        divisors = sorted(self._divisors(magic, power), key=lambda divisor: (abs(divisor), divisor < 0))
+        return divisors[-1] if divisors else default
+
+    def __getitem__(self, key: Tuple[int, int]) -> int:
+        if (divisor := self.get(key)) is None:
+            raise KeyError(key)
+        return divisor
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return self.get(key) is not None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(max_divisor={self.max_divisor}, bits={self.bits})"
+
+    def _divisors(self, key_magic: int, power: int) -> Iterator[int]:
+        # the positive entry has the magic as key, the negative one its negation as bits-wide integer
+        for magic, sign in ((key_magic, 1), (-key_magic, -1), (2 ** self.bits - key_magic, -1)):
+            for divisor in self._candidates(magic, power):
+                if self._key(divisor * sign, power) == (key_magic, power):
+                    yield divisor * sign
+
+    def _candidates(self, magic: int, power: int) -> Iterator[int]:
+        if magic < 2 or power > magic.bit_length() + self.max_divisor.bit_length():
+            return
+        y = 2 ** power
+        # smallest divisor with ceil(y / divisor) == magic
+        divisor = -(-y // magic)
+        while (divisor <= self.max_divisor and -(-y // divisor) == magic
+               and _has_minimal_error(power, divisor, self.bits)):
+            is_minimal_power = power == self.bits or not _has_minimal_error(power - 1, divisor, self.bits)
+            if divisor & (divisor - 1) and is_minimal_power:
+                yield divisor
+            divisor += 1
+
+    def _key(self, divisor: int, power: int) -> Tuple[int, int]:
+        """The key of the divisor in _compute_magic_map, for the given power"""
+        magic = (2 ** power + abs(divisor) - 1) // abs(divisor)
+        if divisor > 0:
+            return magic, power
+        signed_magic = _to_signed(magic, self.bits)
+        return (-magic if signed_magic > 0 else -signed_magic), power
+
+
 def _dump_magic_map(magic_map: Dict[Tuple[int, int], int], path: pathlib.Path) -> None:
     """Wir save reverted map to file for serialization simplicity sake: each (magic, pow) : div is unique,
     so we just swap them and use div as a json dict key"""
@@ -1,6 +1,6 @@
 import json
 import pathlib
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Iterator, Optional
 
 from config import ROOT
 
@@ -77,6 +77,87 @@ def _compute_power_with_minimal_error(divisor: int) -> Tuple[int, float]:
     return power, error
 
 
+def _has_minimal_error(power: int, divisor: int, bits: int = DEFAULT_POWER) -> bool:
+    """The error criterion of _compute_power_with_minimal_error for bits-wide operands, in integer arithmetic"""
+    y = 2 ** power
+    return (divisor - 1 - (y - 1) % divisor) * (2 ** bits - 1) < y
+
+
+class UnsignedMagicDivisors:
+    """
+    The magic map for every unsigned divisor of bits-wide operands up to 2 ** (bits - 1), without a table:
+    (magic, power) -> divisor. Inverts magic = ceil(2 ** power / divisor) like SignedMagicDivisors, magics from
+    2 ** bits - 1 on have their keys reduced by 2 ** bits as in _compute_magic_number.
+    """
+
+    def __init__(self, max_divisor: Optional[int] = None, bits: int = DEFAULT_POWER):
+        """
+        :param max_divisor: largest divisor, by default 2 ** (bits - 1): unsigned division by a larger divisor is
+                            compiled to a comparison (the quotient is 0 or 1), not to a magic number
+        :param bits: width of the operands, 32 or 64
+        """
+        self.bits = bits
+        self.max_divisor = max_divisor or 2 ** (bits - 1)
+
+    def get(self, key: Tuple[int, int], default: Optional[int] = None) -> Optional[int]:
+        magic, power = key
+        if not isinstance(magic, int) or not isinstance(power, int) or power < self.bits:
+            return default
+        # the largest divisor was written last to the magic map
+        return max(self._divisors(magic, power), default=default)
+
+    def get_pre_shifted(self, key: Tuple[int, int], shift: int, default: Optional[int] = None) -> Optional[int]:
+        """
+        The divisor of a division whose dividend is shifted right by shift before the multiplication, as done for even
+        divisors whose magic number would not fit into bits: key is the one of the odd part for the narrower dividend,
+        e.g. x / 1000 as (x >> 3) / 125 with magic = ceil(2 ** 68 / 125) for 61-bit dividends
+        """
+        magic, power = key
+        if not isinstance(magic, int) or not isinstance(power, int) or power < self.bits or not 0 < shift < self.bits:
+            return default
+        odd_divisors = [divisor for divisor in self._candidates(magic, power, self.bits - shift)
+                        if divisor % 2 and self._key(divisor, power) == key]
+        if not odd_divisors or max(odd_divisors) << shift > self.max_divisor:
+            return default
+        return max(odd_divisors) << shift
+
+    def __getitem__(self, key: Tuple[int, int]) -> int:
+        if (divisor := self.get(key)) is None:
+            raise KeyError(key)
+        return divisor
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return self.get(key) is not None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(max_divisor={self.max_divisor}, bits={self.bits})"
+
+    def _divisors(self, key_magic: int, power: int) -> Iterator[int]:
+        for magic in (key_magic, key_magic + 2 ** self.bits):
+            for divisor in self._candidates(magic, power):
+                if self._key(divisor, power) == (key_magic, power):
+                    yield divisor
+
+    def _candidates(self, magic: int, power: int, operand_bits: Optional[int] = None) -> Iterator[int]:
+        operand_bits = operand_bits or self.bits
+        if magic < 2 or power > magic.bit_length() + self.max_divisor.bit_length():
+            return
+        y = 2 ** power
+        # smallest divisor with ceil(y / divisor) == magic
+        divisor = -(-y // magic)
+        while (divisor <= self.max_divisor and -(-y // divisor) == magic
+               and _has_minimal_error(power, divisor, operand_bits)):
+            is_minimal_power = power == self.bits or not _has_minimal_error(power - 1, divisor, operand_bits)
+            if divisor & (divisor - 1) and is_minimal_power:
+                yield divisor
+            divisor += 1
+
+    def _key(self, divisor: int, power: int) -> Tuple[int, int]:
+        """The key of the divisor in _compute_magic_map, for the given power"""
+        magic = (2 ** power + divisor - 1) // divisor
+        return (magic if magic < 2 ** self.bits - 1 else magic - 2 ** self.bits), power
+
+
 def _dump_magic_map(magic_map: Dict[Tuple[int, int], int], path: pathlib.Path) -> None:
     """Wir save reverted map to file for serialization simplicity sake: each (magic, pow) : div is unique,
     so we just swap them and use div as a json dict key"""
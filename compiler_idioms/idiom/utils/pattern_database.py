@@ -0,0 +1,387 @@
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import tempfile
+from collections import defaultdict
+from typing import List, Dict, Tuple, Optional, Any, NamedTuple, FrozenSet
+
+import yaml
+
+from compiler_idioms.anonymization import EncodedInstruction, SKELETONS, ANONYMIZED_NAME_PATTERN, \
+    prev_encode_anonymized_instructions
+from compiler_idioms.instruction import Instruction, from_anonymized_pattern
+from config import PATTERNS_DIR, PATTERN_DATABASE_PATH
+
+# increase whenever the stored form, the loading of the sources or the prev-encoding changes
+PATTERN_DATABASE_VERSION = 4
+# first word of the header line of a database file
+PATTERN_DATABASE_MAGIC = "PIDARCI-PATTERNS"
+MULTIPLICATION_PATTERN_FILE = "patterns-mul.yaml"
+# idioms stored in the database, by the name their patterns are loaded with
+OPERATIONS = ("mods", "modu", "divs", "divu", "mul")
+# patterns-divs-O2.json, patterns-divs64-O2.json for the long long operations
+PATTERN_FILE_NAME_PATTERN = re.compile(r"patterns-(?P<operation>[a-z]+(?:64)?)-(?P<level>O\w+)\.json")
+# data/mulu/clusters/O0/cluster_30.json
+CLUSTER_PATH_PATTERN = re.compile(
+    r"(?P<operation>[a-z]+(?:64)?)/clusters/(?P<level>O\w+)/cluster_(?P<cluster>\w+)\.json$")
+
+
+class PatternOrigin(NamedTuple):
+    """
+    Where a pattern was found, the compiler is None if the pattern files do not name it
+    """
+    operation: str
+    compiler: Optional[str]
+    optimization_level: Optional[str]
+    cluster: Optional[str]
+
+
+class IdiomPatterns:
+    """
+    sequences: anonymized instruction sequences of the idiom, in the order of the sources, without duplicates
+    metadata: per sequence what the idiom needs to reconstruct the original operation, e.g. the expression of the
+              constant of a multiplication, None if there is nothing
+    origins: per sequence all origins of the sequence and its duplicates
+    """
+
+    def __init__(self, sequences: List[List[Instruction]], metadata: List[Any] = None,
+                 origins: List[FrozenSet[PatternOrigin]] = None):
+        self.sequences = sequences
+        self.metadata = metadata if metadata is not None else [None] * len(sequences)
+        self.origins = origins if origins is not None else [frozenset()] * len(sequences)
+
+    def deduplicate(self) -> "IdiomPatterns":
+        """
+        Merges the sequences that are equal up to the numbering of their anonymized names, i.e. equal after
+        canonical_form, and unites their origins.
+
+        A window is always numbered in the order of first occurrence, so a sequence numbered otherwise never matches.
+        The kept sequence of a group is the first one in canonical numbering (the first one if there is none) with
+        its metadata, at its position. This is the sequence that matched before and searching the merged sequences
+        in the same order gives the same matches.
+        """
+        groups = defaultdict(list)
+        for index, sequence in enumerate(self.sequences):
+            groups[canonical_form(sequence)].append(index)
+        kept = {}
+        for canonical, indices in groups.items():
+            representative = next((i for i in indices if _instruction_tuples(self.sequences[i]) == canonical),
+                                  indices[0])
+            kept[representative] = frozenset().union(*(self.origins[i] for i in indices))
+        order = sorted(kept)
+        return IdiomPatterns([self.sequences[i] for i in order], [self.metadata[i] for i in order],
+                             [kept[i] for i in order])
+
+
+class PatternDatabase:
+    """
+    The patterns of all idioms compiled into one file, so that a process loads them with one read instead of parsing
+    the JSON and YAML sources and prev-encoding every sequence again.
+
+    The file is plain data, never code: a header line with the version and the content hash of the sources, followed
+    by JSON with the distinct anonymized instructions and skeletons, and flat arrays of the instruction ids, skeleton
+    ids and distances of all sequences with the length, owning idiom, reconstruction metadata and origins per
+    sequence. The database is stale when the version or the source hash differs, and rebuilt when it is malformed.
+    """
+
+    def __init__(self, idioms: Dict[str, IdiomPatterns], source_hash: str):
+        self.idioms = idioms
+        self.source_hash = source_hash
+
+    @classmethod
+    def from_sources(cls, patterns_dir: pathlib.Path = PATTERNS_DIR) -> "PatternDatabase":
+        idioms = {operation: load_patterns_from_sources(operation, patterns_dir) for operation in OPERATIONS}
+        return cls(idioms, source_hash(patterns_dir))
+
+    def dumps(self) -> bytes:
+        instructions = {}
+        skeletons = {}
+        instruction_ids = []
+        skeleton_ids = []
+        distances = []
+        lengths = []
+        owners = []
+        metadata = []
+        origins = []
+        for owner, operation in enumerate(OPERATIONS):
+            patterns = self.idioms[operation]
+            for sequence, sequence_metadata, sequence_origins in zip(patterns.sequences, patterns.metadata,
+                                                                     patterns.origins):
+                instruction_ids.extend(instructions.setdefault((instr.mnemonic, instr.operands), len(instructions))
+                                       for instr in sequence)
+                for encoded in encode_pattern(sequence):
+                    skeleton_ids.append(skeletons.setdefault((encoded.mnemonic, encoded.operands), len(skeletons)))
+                    distances.append(encoded.distances)
+                lengths.append(len(sequence))
+                owners.append(owner)
+                metadata.append(sequence_metadata)
+                origins.append(sorted(sequence_origins, key=repr))
+        header = f"{PATTERN_DATABASE_MAGIC} {PATTERN_DATABASE_VERSION} {self.source_hash}\n"
+        return header.encode() + json.dumps({
+            "instructions": list(instructions),
+            "skeletons": list(skeletons),
+            "instruction_ids": instruction_ids,
+            "skeleton_ids": skeleton_ids,
+            "distances": distances,
+            "lengths": lengths,
+            "owners": owners,
+            "metadata": metadata,
+            "origins": origins,
+        }, separators=(",", ":")).encode()
+
+    @classmethod
+    def loads(cls, data: bytes, expected_source_hash: str) -> Optional["PatternDatabase"]:
+        """
+        :return: None if the database is stale
+        :raises ValueError: if the data is not a database of this version
+        """
+        header, _, body = data.partition(b"\n")
+        if header.split() != [PATTERN_DATABASE_MAGIC.encode(), str(PATTERN_DATABASE_VERSION).encode(),
+                              expected_source_hash.encode()]:
+            return None
+        content = json.loads(body)
+        _validate(content)
+        # equal pattern instructions are shared, they are never modified
+        instructions = [Instruction(-1, mnemonic, tuple(operands)) for mnemonic, operands in content["instructions"]]
+        skeletons = [(mnemonic, tuple(operands), SKELETONS.intern((mnemonic, tuple(operands))))
+                     for mnemonic, operands in content["skeletons"]]
+        idioms = {operation: IdiomPatterns([], [], []) for operation in OPERATIONS}
+        start = 0
+        for length, owner, sequence_metadata, sequence_origins in zip(content["lengths"], content["owners"],
+                                                                      content["metadata"], content["origins"]):
+            end = start + length
+            sequence = [instructions[i] for i in content["instruction_ids"][start:end]]
+            _remember_encoding(sequence, _decode(content["skeleton_ids"][start:end],
+                                                 content["distances"][start:end], skeletons))
+            patterns = idioms[OPERATIONS[owner]]
+            patterns.sequences.append(sequence)
+            patterns.metadata.append(sequence_metadata)
+            patterns.origins.append(frozenset(PatternOrigin(*origin) for origin in sequence_origins))
+            start = end
+        return cls(idioms, expected_source_hash)
+
+    def store(self, path=PATTERN_DATABASE_PATH) -> None:
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary file first, processes starting meanwhile must not read a partial database
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.dumps())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _decode(skeleton_ids: List[int], distances: List[List[int]], skeletons) -> List[EncodedInstruction]:
+    encoded_instructions = []
+    position = 0
+    for skeleton_id, instruction_distances in zip(skeleton_ids, distances):
+        mnemonic, operands, skeleton = skeletons[skeleton_id]
+        encoded_instructions.append(EncodedInstruction(mnemonic, operands, tuple(instruction_distances), position,
+                                                       skeleton))
+        position += len(instruction_distances)
+    return encoded_instructions
+
+
+def _validate(content: Any) -> None:
+    """
+    Checks the types and the shape of a loaded database before anything is built from it.
+
+    :raises ValueError: if the content is malformed
+    """
+
+    def is_list(value, check=lambda item: True, length=None) -> bool:
+        return isinstance(value, list) and (length is None or len(value) == length) and all(map(check, value))
+
+    def is_str_or_none(value) -> bool:
+        return value is None or isinstance(value, str)
+
+    def is_count(value) -> bool:
+        return type(value) is int and value >= 0
+
+    def is_index(bound: int):
+        return lambda value: type(value) is int and 0 <= value < bound
+
+    def is_instruction(value) -> bool:
+        return is_list(value, length=2) and isinstance(value[0], str) and is_list(value[1], lambda x: isinstance(x, str))
+
+    if not isinstance(content, dict) or not all(is_list(content.get(key)) for key in (
+            "instructions", "skeletons", "instruction_ids", "skeleton_ids", "distances", "lengths", "owners",
+            "metadata", "origins")):
+        raise ValueError("malformed pattern database")
+    sequence_count = len(content["lengths"])
+    instruction_count = len(content["instruction_ids"])
+    if not (is_list(content["instructions"], is_instruction)
+            and is_list(content["skeletons"], is_instruction)
+            and is_list(content["instruction_ids"], is_index(len(content["instructions"])))
+            and is_list(content["skeleton_ids"], is_index(len(content["skeletons"])), instruction_count)
+            and is_list(content["distances"], lambda value: is_list(value, is_count), instruction_count)
+            and is_list(content["lengths"], is_count)
+            and sum(content["lengths"]) == instruction_count
+            and is_list(content["owners"], is_index(len(OPERATIONS)), sequence_count)
+            and is_list(content["metadata"], is_str_or_none, sequence_count)
+            and is_list(content["origins"], lambda value: is_list(value, lambda origin: is_list(
+                origin, is_str_or_none, len(PatternOrigin._fields))), sequence_count)):
+        raise ValueError("malformed pattern database")
+
+
+# prev-encodings of the pattern sequences by the keys of their instructions, see encode_pattern
+_ENCODED_PATTERNS: Dict[Tuple[int, ...], List[EncodedInstruction]] = {}
+
+
+def _remember_encoding(sequence: List[Instruction], encoded_instructions: List[EncodedInstruction]) -> None:
+    _ENCODED_PATTERNS[tuple(instr.intern_key() for instr in sequence)] = encoded_instructions
+
+
+def encode_pattern(sequence: List[Instruction]) -> List[EncodedInstruction]:
+    """
+    prev_encode_anonymized_instructions of an idiom sequence, computed once per process for equal sequences,
+    or taken from the pattern database
+    """
+    key = tuple(instr.intern_key() for instr in sequence)
+    if (encoded_instructions := _ENCODED_PATTERNS.get(key)) is None:
+        encoded_instructions = _ENCODED_PATTERNS[key] = prev_encode_anonymized_instructions(sequence)
+    return encoded_instructions
+
+
+def source_hash(patterns_dir: pathlib.Path = PATTERNS_DIR) -> str:
+    """
+    :return: SHA-256 over the names and contents of all pattern files
+    """
+    digest = hashlib.sha256()
+    for path in sorted(pathlib.Path(patterns_dir).iterdir()):
+        if path.is_file():
+            digest.update(path.name.encode() + b"\0")
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def load_pattern_database(path=PATTERN_DATABASE_PATH, patterns_dir: pathlib.Path = PATTERNS_DIR) -> PatternDatabase:
+    """
+    Loads the compiled patterns once per process. If there is no up-to-date database, the patterns are loaded from
+    the sources and the database is written for the next process, if possible.
+    """
+    current_source_hash = source_hash(patterns_dir)
+    if path:
+        try:
+            database = PatternDatabase.loads(pathlib.Path(path).read_bytes(), current_source_hash)
+            if database is not None:
+                return database
+        except (OSError, ValueError, RecursionError):
+            # missing, malformed or written by an incompatible version, it is built again
+            pass
+    database = PatternDatabase.from_sources(patterns_dir)
+    if path:
+        try:
+            database.store(path)
+        except OSError:
+            # e.g. a read-only installation, the sources are parsed every time
+            pass
+    return database
+
+
+def load_patterns_from_sources(operation: str, patterns_dir: pathlib.Path = PATTERNS_DIR) -> IdiomPatterns:
+    if operation == "mul":
+        patterns = _load_multiplication_patterns(pathlib.Path(patterns_dir) / MULTIPLICATION_PATTERN_FILE)
+    else:
+        patterns = _load_json_patterns(operation, pathlib.Path(patterns_dir))
+    return patterns.deduplicate()
+
+
+def _load_json_patterns(operation: str, patterns_dir: pathlib.Path) -> IdiomPatterns:
+    patterns = []
+    try:
+        for pattern_file in patterns_dir.glob(f"*{operation}*"):
+            file_name = PATTERN_FILE_NAME_PATTERN.fullmatch(pattern_file.name)
+            with pattern_file.open("r") as f:
+                data = json.load(f)
+                for seq in data:
+                    pattern = seq.get("sequence")
+                    anonymized_instruction_list = from_anonymized_pattern(pattern)
+                    if anonymized_instruction_list:
+                        origin = PatternOrigin(file_name["operation"] if file_name else operation, None,
+                                               file_name["level"] if file_name else None, seq.get("cluster"))
+                        patterns.append((anonymized_instruction_list, origin))
+        patterns = sorted(patterns, key=lambda pattern: len(pattern[0]), reverse=False)
+    except FileNotFoundError as e:
+        print("No pattern file for division found")
+    return IdiomPatterns([sequence for sequence, _ in patterns], None,
+                         [frozenset([origin]) for _, origin in patterns])
+
+
+def _load_multiplication_patterns(path: pathlib.Path) -> IdiomPatterns:
+    """
+    The sequences with the expressions computing the constant from the anonymized constants as metadata
+    """
+    sequences = []
+    constants = []
+    origins = []
+    with path.open() as f:
+        text = f.read()
+    try:
+        # the file is written as JSON, which the YAML parser reads much slower
+        documents = [json.loads(text)]
+    except ValueError:
+        documents = yaml.load_all(text, Loader=yaml.FullLoader)
+    for obj in documents:
+        for idiom_sequence in obj:
+            sequences.append(_str_list_to_instr_list(idiom_sequence["pattern"]))
+            constants.append(idiom_sequence["constant"])
+            origins.append(frozenset(_cluster_origin(cluster) for cluster in idiom_sequence.get("clusters", [])))
+    return IdiomPatterns(sequences, constants, origins)
+
+
+def _cluster_origin(cluster_path: str) -> PatternOrigin:
+    if m := CLUSTER_PATH_PATTERN.search(cluster_path):
+        return PatternOrigin(m["operation"], None, m["level"], m["cluster"])
+    return PatternOrigin("mul", None, None, cluster_path)
+
+
+def canonical_form(sequence: List[Instruction]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    """
+    (mnemonic, operands) of the sequence with the anonymized names numbered per kind in the order of their first
+    occurrence, as the anonymization of a window does: mov reg_1, const_2; add reg_0, reg_1 ->
+    mov reg_0, const_0; add reg_1, reg_0
+    """
+    names = {}
+    counters = defaultdict(int)
+
+    def rename(m: re.Match) -> str:
+        if (name := names.get(m.group(0))) is None:
+            kind = m.group(1)
+            name = names[m.group(0)] = f"{kind}{counters[kind]}"
+            counters[kind] += 1
+        return name
+
+    return tuple((instr.mnemonic, tuple(ANONYMIZED_NAME_PATTERN.sub(rename, operand) for operand in instr.operands))
+                 for instr in sequence)
+
+
+def _instruction_tuples(sequence: List[Instruction]) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+    return tuple((instr.mnemonic, instr.operands) for instr in sequence)
+
+
+def _str_list_to_instr_list(str_list: List[str]) -> List[Instruction]:
+    return [
+        Instruction(
+            address=-1,
+            mnemonic=(mnemonic := s.split(" ")[0]),
+            operands=tuple(map(lambda x: x.strip(), s[len(mnemonic):].split(",")))
+        )
+        for s in str_list
+    ]
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else PATTERN_DATABASE_PATH
+    pattern_database = PatternDatabase.from_sources()
+    pattern_database.store(target)
+    print(f"{sum(len(p.sequences) for p in pattern_database.idioms.values())} patterns of "
+          f"{len(pattern_database.idioms)} idioms written to {target}")
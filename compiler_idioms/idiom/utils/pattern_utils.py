@@ -1,23 +1,11 @@
-import json
-
-from compiler_idioms.instruction import from_anonymized_pattern
-from config import ROOT
-
-PATTERN_DIR = ROOT / 'patterns'
+from compiler_idioms.idiom.utils.pattern_database import load_pattern_database, load_patterns_from_sources
 
 
 def load_pattern_sequences_for_operation(operation):
-    sequences = []
-    try:
-        for pattern_file in PATTERN_DIR.glob(f"*{operation}*"):
-            with pattern_file.open("r") as f:
-                data = json.load(f)
-                for seq in data:
-                    pattern = seq.get("sequence")
-                    anonymized_instruction_list = from_anonymized_pattern(pattern)
-                    if anonymized_instruction_list:
-                        sequences.append(anonymized_instruction_list)
-        sequences = sorted(sequences, key=len, reverse=False)
-    except FileNotFoundError as e:
-        print("No pattern file for division found")
-    return sequences
+    """
+    The sequences of the compiled pattern database, the sources are only parsed for operations not in there.
+    The list is a copy, the idioms may add their own sequences.
+    """
+    database = load_pattern_database()
+    patterns = database.idioms.get(operation) or load_patterns_from_sources(operation)
+    return list(patterns.sequences)
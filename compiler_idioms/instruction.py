@@ -1,13 +1,119 @@
-from dataclasses import dataclass
-from typing import List
+from collections.abc import Sequence
+from typing import List, Dict, Hashable, Iterator, Optional
+
+
+class Interner:
+    """
+    Maps hashable tokens to small consecutive integers, so that the hot path compares integers instead of strings.
+    The ids are only valid within one process.
+
+    Only the tokens of the idiom-sequences are interned, the tokens of the analyzed binaries are looked up. So the
+    interners do not grow in a long-lived process, e.g. a corpus worker, and all unknown tokens get UNKNOWN.
+    """
+
+    def __init__(self):
+        self._ids: Dict[Hashable, int] = {}
+        self.tokens: List[Hashable] = []
+
+    def intern(self, token: Hashable) -> int:
+        if (token_id := self._ids.get(token)) is None:
+            token_id = self._ids[token] = len(self.tokens)
+            self.tokens.append(token)
+        return token_id
+
+    def lookup(self, token: Hashable) -> int:
+        """
+        :return: the id of the token if it was interned, otherwise UNKNOWN
+        """
+        return self._ids.get(token, UNKNOWN)
+
+    def __getitem__(self, token_id: int) -> Hashable:
+        return self.tokens[token_id]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+
+# id of the tokens that were never interned, equal to no interned token
+UNKNOWN = -1
+# (mnemonic, operands) of the anonymized instructions of the idiom-sequences
+INSTRUCTION_KEYS = Interner()
 
 
-@dataclass
 class Instruction:
-    address: int
-    mnemonic: str
-    operands: tuple
-    matched: bool = False
+    """
+    Slotted, since there is one instruction object per disassembled and per anonymized instruction.
+    Instructions compare like the former dataclass; `key` is the interned (mnemonic, operands) used for matching.
+    """
+    __slots__ = ('address', 'mnemonic', 'operands', 'matched')
+
+    def __init__(self, address: int, mnemonic: str, operands: tuple, matched: bool = False):
+        self.address = address
+        self.mnemonic = mnemonic
+        self.operands = operands
+        self.matched = matched
+
+    @property
+    def key(self) -> int:
+        """
+        Equal for instructions with equal mnemonic and operands, regardless of the address, UNKNOWN unless an
+        instruction of an idiom-sequence has them (see intern_key). Not cached, since the fields may change.
+        """
+        return INSTRUCTION_KEYS.lookup((self.mnemonic, self.operands))
+
+    def intern_key(self) -> int:
+        """
+        Interns the mnemonic and operands of an instruction of an idiom-sequence
+        :return: its key
+        """
+        return INSTRUCTION_KEYS.intern((self.mnemonic, self.operands))
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.address, self.mnemonic, self.operands, self.matched) == (
+            other.address, other.mnemonic, other.operands, other.matched)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Instruction(address={self.address!r}, mnemonic={self.mnemonic!r}, operands={self.operands!r}, " \
+               f"matched={self.matched!r})"
+
+
+class InstructionWindow(Sequence):
+    """
+    View of instructions[start:stop] without copying them, e.g. a candidate window of a function.
+    Slicing a window returns a window over the same instructions, so marking the instructions of a window as matched
+    marks the instructions of the function.
+    """
+    __slots__ = ('_instructions', '_start', '_stop')
+
+    def __init__(self, instructions: Sequence, start: int = 0, stop: Optional[int] = None):
+        self._instructions = instructions
+        self._start, self._stop, _ = slice(start, stop).indices(len(instructions))
+        self._stop = max(self._start, self._stop)
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return InstructionWindow(self._instructions, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("instruction window index out of range")
+        return self._instructions[self._start + index]
+
+    def __iter__(self) -> Iterator[Instruction]:
+        return map(self._instructions.__getitem__, range(self._start, self._stop))
+
+    def __repr__(self):
+        return f"InstructionWindow({list(self)!r})"
 
 
 def from_anonymized_pattern(anonymized_pattern: List) -> List[Instruction]:
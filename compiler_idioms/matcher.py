@@ -1,96 +1,195 @@
+import heapq
+import multiprocessing
 import sys
-from typing import List
-from icecream import ic
+from collections import defaultdict
+from typing import List, Optional, Tuple, Iterator, Sequence
 
-from compiler_idioms.anonymization import anonymize_instruction, anonymize_instructions_smda
+from compiler_idioms.anonymization import FunctionAnonymization, window_prev_encoding
 # from compiler_idioms.disassembly.binja_disassembly import BinjaDisassembly
+from compiler_idioms.disassembly.cache import DisassemblyCache
+from compiler_idioms.disassembly.linear_disassembly import LinearSweepDisassembly
 from compiler_idioms.disassembly.smda_disassembly import SMDADisassembly
 #from compiler_idioms.idiom.implementations.division import SignedDivisionInstructionSequence
 from compiler_idioms.idiom.implementations.divs_msvc import SignedDivisionInstructionSequence
 from compiler_idioms.idiom.implementations.mods_msvc import SignedModuloInstructionSequence
 #from compiler_idioms.idiom.implementations.division_unsigned import UnsignedDivisionInstructionSequence
 from compiler_idioms.idiom.implementations.divu_msvc import UnsignedDivisionInstructionSequence
-from compiler_idioms.idiom.implementations.divu86 import UnsignedDivisionInstructionSequence86
 from compiler_idioms.idiom.implementations.multiplication import SignedMultiplicationInstructionSequence
-from compiler_idioms.idiom.implementations.remainder_signed_todo import SignedRemainderInstructionSequence
 #from compiler_idioms.idiom.implementations.mods import SignedModuloInstructionSequence
 from compiler_idioms.idiom.implementations.modu_msvc import UnsignedModuloInstructionSequence
-from compiler_idioms.instruction import Instruction
+from compiler_idioms.idiom.instruction_sequence import InstructionSequence
+from compiler_idioms.idiom.registry import idiom_index
+from compiler_idioms.instruction import Instruction, InstructionWindow
 from compiler_idioms.match import Match
+from config import DISASSEMBLY_CACHE_DIR
 
+BACKENDS = ("smda", "linear")
+# The idiom handlers also look at the instructions after the matched ones (e.g. the register copied after a div, the
+# number of constants in the window) and their result depends on it, so the windows handed to them keep this length.
+# The prefix tree walk before only encodes as many instructions as the idiom sequences can still match.
+HANDLER_WINDOW = 25
+# asked in this order, see Matcher._search
+IDIOMS = (
+    SignedModuloInstructionSequence,
+    UnsignedModuloInstructionSequence,
+    SignedDivisionInstructionSequence,
+    UnsignedDivisionInstructionSequence,
+    SignedMultiplicationInstructionSequence,
+)
 
 
 class Matcher:
     """
     """
 
-    def __init__(self):
-        self.idioms = [
-            SignedModuloInstructionSequence(),
-            UnsignedModuloInstructionSequence(),
-            SignedDivisionInstructionSequence(),
-            UnsignedDivisionInstructionSequence(),
-            SignedMultiplicationInstructionSequence(),
-        ]
-
-    def find_idioms_in_file(self, file_path: str="", bv=None, buffer=None) -> List[Match]:
+    def __init__(self, disassembly_cache_dir: Optional[str] = DISASSEMBLY_CACHE_DIR, backend: str = "smda",
+                 opcode_prefilter: bool = False):
+        """
+        :param disassembly_cache_dir: directory of the persistent disassembly cache, None (or empty) disables it
+        :param backend: "smda" for the recursive disassembly by SMDA or "linear" for the faster linear sweep
+                        (see LinearSweepDisassembly), which is not cached
+        :param opcode_prefilter: only match functions containing an anchor opcode (imul, mul, div, idiv, shr, sar),
+                                 found by a scan of the raw bytes, see OpcodePrefilter
         """
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown disassembly backend {backend}, choose one of {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.opcode_prefilter = opcode_prefilter
+        self.disassembly_cache = DisassemblyCache(disassembly_cache_dir) if disassembly_cache_dir else None
+        self.idiom_classes = IDIOMS
+        # the index and the data of the idioms are shared by all matchers of the process, see registry
+        self.prefix_tree, self.automaton, self.prefilter = idiom_index(self.idiom_classes)
+        # instantiated when a pattern of the idiom matches for the first time
+        self._idioms: List[Optional[InstructionSequence]] = [None] * len(self.idiom_classes)
+
+    @property
+    def idioms(self) -> List[InstructionSequence]:
+        return [self._idiom(idiom_index) for idiom_index in range(len(self.idiom_classes))]
+
+    def _idiom(self, idiom_index: int) -> InstructionSequence:
+        if (idiom := self._idioms[idiom_index]) is None:
+            idiom = self._idioms[idiom_index] = self.idiom_classes[idiom_index]()
+        return idiom
 
+    def find_idioms_in_file(self, file_path: str="", bv=None, buffer=None, jobs: int = 1) -> List[Match]:
         """
-        ic("Path:", file_path)
+        :param jobs: number of worker processes matching the functions of the binary in parallel.
+                     The workers are forked and inherit the loaded idioms, the result is the same as with jobs=1.
+        """
+        return list(self.iter_idioms_in_file(file_path, bv, buffer, jobs))
 
-        matches = []
-        disassembly = SMDADisassembly(file_path, buffer=buffer)
+    def iter_idioms_in_file(self, file_path: str="", bv=None, buffer=None, jobs: int = 1) -> Iterator[Match]:
+        """
+        Yields the matches of every function as soon as the function is processed, in address order.
+        With jobs > 1 the matches are yielded once all workers are done.
+        """
+        if self.backend == "linear":
+            disassembly = LinearSweepDisassembly(file_path, buffer=buffer, opcode_prefilter=self.opcode_prefilter)
+        else:
+            disassembly = SMDADisassembly(file_path, buffer=buffer, cache=self.disassembly_cache,
+                                          opcode_prefilter=self.opcode_prefilter)
         #disassembly = BinjaDisassembly(file_path, bv)
+        if jobs > 1 and "fork" in multiprocessing.get_all_start_methods():
+            yield from self._find_idioms_in_parallel(list(disassembly.next_disassembly_function()), disassembly, jobs)
+            return
         for function in disassembly.next_disassembly_function():
-            for i, instruction in enumerate(function):
-                # if instruction.address >= 4226676 and instruction.address<=4226687:
-                #     ic()
-                #     ic(i)
-                #     ic(instruction)
-                    #4226683
-                # if instruction.address == 4226683:
-                #     ic()
-                #     ic(instruction)
-                #     ic(function[i:i + 100])
-                # if instruction.matched:  # jump over matched instructions
-                #     continue
-                for idiom in self.idioms:
-                    if instruction.matched:  # jump over matched instructions
-                        continue
-                    anonymized_first_instruction = anonymize_instruction(instruction)
-
-                    if idiom.matches_first_instruction(anonymized_first_instruction):
-                        anonymized_first_instructions, orig_constants, orig_registers = anonymize_instructions_smda(function[i:])
-                        # if instruction.address == 0x004234b5:
-                        #     print(function[i:])
-                        #     print(anonymized_first_instructions)
-                        #     print(orig_constants)
-                        #     print(orig_registers)
-                        # if anonymized_first_instruction.mnemonic == 'movsx':
-                        #     ic(function[i:])
-                        #     ic(anonymized_first_instructions)
-
-
-
-                        if match := idiom.search(anonymized_first_instructions, orig_constants, orig_registers):
-                            if not match:continue
-                            #print(f"found match for idiom {match} on address {hex(match.address)}")
-                            self._mark_instructions_as_matched(
-                                function[i:i + match.length], match,
-                                disassembly)  # +1? mark matched instructions to not to search for other idioms there
-                            #yield match
-                            matches.append(match)
+            yield from self._find_idioms_in_function(function, disassembly)
         #disassembly.save_database()
+
+    def _find_idioms_in_function(self, function: List[Instruction], disassembly) -> List[Match]:
+        matches = []
+        if not self.prefilter.may_match(function):
+            return matches
+        anonymization = FunctionAnonymization(function, window=HANDLER_WINDOW)
+        skeletons = [encoded_instruction.skeleton for encoded_instruction in anonymization.encoded]
+        for i in self.automaton.candidate_starts(skeletons):
+            if function[i].matched:  # jump over matched instructions
+                continue
+            if match := self._search(anonymization, i):
+                #print(f"found match for idiom {match} on address {hex(match.address)}")
+                self._mark_instructions_as_matched(
+                    InstructionWindow(function, i, i + match.length), match,
+                    disassembly)  # +1? mark matched instructions to not to search for other idioms there
+                matches.append(match)
+        return matches
+
+    def _find_idioms_in_parallel(self, functions: List[List[Instruction]], disassembly, jobs: int) -> List[Match]:
+        """
+        Functions are matched independently of each other. They are split into chunks with about the same number of
+        instructions, the matches are merged in the order of the functions, i.e. in address order.
+        With fewer than two chunks (e.g. no function left after the prefilter), the functions are matched in-process.
+        """
+        global _forked_state
+        chunks = _balance_by_instruction_count(functions, jobs)
+        if len(chunks) < 2:
+            return [match for function in functions for match in self._find_idioms_in_function(function, disassembly)]
+        _forked_state = self, functions, disassembly
+        try:
+            with multiprocessing.get_context("fork").Pool(len(chunks)) as pool:
+                results = pool.map(_find_idioms_in_chunk, chunks)
+        finally:
+            _forked_state = None
+        function_matches = dict(item for chunk_result in results for item in chunk_result)
+        matches = []
+        for function_index, function in enumerate(functions):
+            # the workers marked their own copies of the instructions
+            addresses = {instr.address: i for i, instr in enumerate(function)}
+            for match in function_matches.get(function_index, []):
+                start = addresses[match.address]
+                self._mark_instructions_as_matched(InstructionWindow(function, start, start + match.length), match,
+                                                   disassembly)
+                matches.append(match)
         return matches
 
+    def _search(self, anonymization: FunctionAnonymization, start: int) -> Optional[Match]:
+        """
+        Walks the prefix tree once along the prev-encoded window and lets the idioms owning the matched patterns
+        handle the match. Only then the window is anonymized to recover the original constants and registers,
+        once for all idioms.
+        Idioms are asked in the order of self.idiom_classes, each with its longest matched pattern first.
+        """
+        candidates = defaultdict(list)
+        encoded_window = window_prev_encoding(anonymization.encoded, start, window=self.prefix_tree.height)
+        for owner, sequence_index, _ in self.prefix_tree.search(encoded_window):
+            candidates[owner].append(sequence_index)
+        if not candidates:
+            return None
+        sequence, original_constants, original_registers = anonymization.window(start)
+        for owner in sorted(candidates):
+            if match := self._idiom(owner).search(sequence, original_constants, original_registers,
+                                                  candidates[owner]):
+                return match
+        return None
+
     @staticmethod
-    def _mark_instructions_as_matched(instructions: List[Instruction], match: Match, disassembly):
+    def _mark_instructions_as_matched(instructions: Sequence[Instruction], match: Match, disassembly):
         for instr in instructions:
             instr.matched = True
             #disassembly.set_tag(tag_name=f'compiler_idiom: {match.operation}', address=instr.address, text=f'{match.operand},{match.constant}')
 
 
+# (matcher, functions, disassembly) of the running parallel search, inherited by the forked workers
+_forked_state = None
+
+
+def _find_idioms_in_chunk(function_indices: List[int]) -> List[Tuple[int, List[Match]]]:
+    matcher, functions, disassembly = _forked_state
+    return [(i, matcher._find_idioms_in_function(functions[i], disassembly)) for i in function_indices]
+
+
+def _balance_by_instruction_count(functions: List[List[Instruction]], jobs: int) -> List[List[int]]:
+    """
+    Greedily assigns the functions, largest first, to the chunk with the fewest instructions so far.
+    :return: function indices per chunk, without empty chunks
+    """
+    chunks = [(0, chunk_index, []) for chunk_index in range(max(1, min(jobs, len(functions))))]
+    for function_index in sorted(range(len(functions)), key=lambda i: len(functions[i]), reverse=True):
+        size, chunk_index, function_indices = heapq.heappop(chunks)
+        function_indices.append(function_index)
+        heapq.heappush(chunks, (size + len(functions[function_index]), chunk_index, function_indices))
+    return [function_indices for _, _, function_indices in sorted(chunks, key=lambda chunk: chunk[1]) if function_indices]
+
+
 if __name__ == "__main__":
     matcher = Matcher()
     matcher.find_idioms_in_file(sys.argv[1])
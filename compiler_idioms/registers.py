@@ -1,3 +1,6 @@
+import re
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
 INTELx64_REGISTERS = [
     # Registers:
     "al",
@@ -136,3 +139,80 @@ INTELx64_REGISTERS = [
     "tr6",
     "tr7",
 ]
+
+
+class Register(NamedTuple):
+    """
+    id: index in INTELx64_REGISTERS
+    family: widest register sharing the storage, e.g. rax for eax, ax, al and ah
+    width: in bits
+    """
+    id: int
+    name: str
+    family: str
+    width: int
+
+
+# registers of a family from the widest to the narrowest, all of them 64, 32, 16, 8 (and 8) bits wide
+_GENERAL_PURPOSE_FAMILIES = [
+    ("rax", "eax", "ax", "al", "ah"),
+    ("rbx", "ebx", "bx", "bl", "bh"),
+    ("rcx", "ecx", "cx", "cl", "ch"),
+    ("rdx", "edx", "dx", "dl", "dh"),
+    ("rsp", "esp", "sp", "spl"),
+    ("rbp", "ebp", "bp", "bpl"),
+    ("rsi", "esi", "si", "sil"),
+    ("rdi", "edi", "di", "dil"),
+    *((f"r{i}", f"r{i}d", f"r{i}w", f"r{i}b") for i in range(8, 16)),
+]
+_GENERAL_PURPOSE_WIDTHS = (64, 32, 16, 8, 8)
+
+
+def _family_and_width(name: str) -> Tuple[str, int]:
+    for family in _GENERAL_PURPOSE_FAMILIES:
+        if name in family:
+            return family[0], _GENERAL_PURPOSE_WIDTHS[family.index(name)]
+    if name.startswith("xmm"):
+        # lower half of the ymm register
+        return f"y{name[1:]}", 128
+    if name.startswith("ymm"):
+        return name, 256
+    if name in {"cs", "ds", "es", "fs", "gs", "ss"}:
+        return name, 16
+    if name.startswith("tr"):
+        return name, 32
+    # rip, debug and control registers
+    return name, 64
+
+
+REGISTERS: Dict[str, Register] = {
+    name: Register(i, name, *_family_and_width(name)) for i, name in enumerate(INTELx64_REGISTERS)
+}
+
+# a lower case word that is not part of a longer word or number, i.e. r8d but neither r8 in r8d nor ax in 0xax
+_WORD_PATTERN = re.compile(r"(?<![a-z0-9])[a-z][a-z0-9]*")
+
+
+def lookup_register(word: str) -> Optional[Register]:
+    """
+    :return: the register if the whole word is one, e.g. r8d, but not r8d1
+    """
+    return REGISTERS.get(word)
+
+
+def iter_registers(text: str) -> Iterator[Tuple[int, Register]]:
+    """
+    Yields (position, register) for all registers of the text in order. A register is only found as a whole word,
+    so every word is looked up once instead of trying all registers at every character.
+    """
+    for m in _WORD_PATTERN.finditer(text):
+        if (register := REGISTERS.get(m.group(0))) is not None:
+            yield m.start(), register
+
+
+def same_family(register0: str, register1: str) -> bool:
+    """
+    :return: whether both registers share their storage, e.g. eax and al, but not ax and bx
+    """
+    r0, r1 = REGISTERS.get(register0), REGISTERS.get(register1)
+    return r0 is not None and r1 is not None and r0.family == r1.family
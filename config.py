@@ -8,6 +8,13 @@ DATA_DIR = ROOT / "data"
 #TEST_DIR = ROOT / "test_samples"
 TEST_DIR = ROOT / "tests"
 PATTERNS_DIR = ROOT / "patterns"
+# disassembled binaries by content hash, set PIDARCI_CACHE_DIR to an empty string to disable the cache
+DISASSEMBLY_CACHE_DIR = os.environ.get("PIDARCI_CACHE_DIR", str(ROOT / ".cache" / "disassembly"))
+# number of distinct operand strings whose tokenization is kept, see anonymization.operand_cache_info
+OPERAND_CACHE_SIZE = int(os.environ.get("PIDARCI_OPERAND_CACHE_SIZE", 65536))
+# patterns compiled by compiler_idioms/idiom/utils/pattern_database.py, rebuilt when the patterns change,
+# set PIDARCI_PATTERN_DATABASE to an empty string to always load the sources
+PATTERN_DATABASE_PATH = os.environ.get("PIDARCI_PATTERN_DATABASE", str(ROOT / ".cache" / "patterns.db"))
 
 
 CONFIG_FILE_PATH = str(os.path.abspath(__file__))
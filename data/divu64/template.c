@@ -0,0 +1,9 @@
+unsigned long long func(unsigned long long num) {
+    unsigned long long res;
+    res = num / %VAL%;
+    return res;
+}
+
+int main(){
+   return 0;
+}
@@ -0,0 +1,9 @@
+long long func( long long num) {
+    long long res;
+    res = num % %VAL%;
+    return res;
+}
+
+int main(){
+   return 0;
+}
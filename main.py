@@ -1,31 +1,196 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import multiprocessing
+import os
 import pathlib
+from collections import Counter
 
 from icecream import ic
 
-from compiler_idioms.matcher import Matcher
+from compiler_idioms.anonymization import operand_cache_info
+from compiler_idioms.idiom.registry import preload
+from compiler_idioms.matcher import Matcher, BACKENDS, IDIOMS
+from config import DISASSEMBLY_CACHE_DIR
 import sys
 import json
 
 
 # ic.disable()
 
+def _decompiler_entry(m):
+    return {"operation": m.operation, "constant": m.constant, "operand": m.operand}
+
+
 def write_file_for_decompiler(filename, matches):
     result = {}
     for m in matches:
-        result[m.address] = {"operation": m.operation, "constant": m.constant, "operand": m.operand}
+        result[m.address] = _decompiler_entry(m)
     with pathlib.Path(filename).open('w') as f:
         json.dump(result, f)
 
 
-def main():
-    matcher = Matcher()
-    matches = matcher.find_idioms_in_file(sys.argv[1])
-    filename = None
-    if len(sys.argv) == 3:
-        filename = sys.argv[2]
+def stream_matches(matches, filename=None):
+    """
+    Prints every match as soon as it is found, in address order instead of sorted by constant.
+    The file for the decompiler is written incrementally, with the same content as write_file_for_decompiler.
+    """
+    with pathlib.Path(filename).open('w') if filename else contextlib.nullcontext() as f:
+        if f:
+            f.write("{")
+        for i, m in enumerate(matches):
+            print(m, flush=True)
+            if f:
+                f.write(f"{', ' if i else ''}{json.dumps(str(m.address))}: {json.dumps(_decompiler_entry(m))}")
+        if f:
+            f.write("}")
+
+
+def print_matches(matches, file=sys.stdout):
     # ic(sorted(matches, key=lambda x: x.constant if x.constant else 0))
     for m in sorted(matches, key=lambda x: x.constant if x.constant else 0):
-        print(m)
+        print(m, file=file)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detects and reverts compiler idioms in binaries.")
+    parser.add_argument("binary", nargs="?", help="binary to scan")
+    parser.add_argument("output", nargs="?", help="JSON file with the matches for the decompiler")
+    parser.add_argument("--corpus", nargs="+", metavar="PATH",
+                        help="scan many binaries: directories (recursively), glob patterns or files, "
+                             "'-' reads a list of files from stdin")
+    parser.add_argument("--output-dir", help="corpus mode: write the matches of every binary to <binary name>.json")
+    parser.add_argument("--stream", action="store_true",
+                        help="print every match as soon as its function is processed (in address order)")
+    parser.add_argument("--backend", choices=BACKENDS, default="smda",
+                        help="disassembler: recursive disassembly by SMDA (default) or a faster linear sweep "
+                             "with a little less recall")
+    parser.add_argument("--opcode-prefilter", action="store_true",
+                        help="only match functions containing imul, mul, div, idiv, shr or sar, found by a scan of "
+                             "the raw bytes (misses e.g. multiplications by lea/shl elsewhere)")
+    parser.add_argument("--cache-dir", default=DISASSEMBLY_CACHE_DIR,
+                        help="directory of the disassembly cache (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true", help="always disassemble, do not use the cache")
+    parser.add_argument("--operand-cache-stats", action="store_true",
+                        help="print hits, misses, size and hit rate of the operand template cache to stderr "
+                             "(of the main process, i.e. not of --jobs workers)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of worker processes (default: 1 for a single binary, all cores for a corpus)")
+    # flags may also stand between the binary and the output file
+    args = parser.parse_intermixed_args(argv)
+    if not args.binary and not args.corpus:
+        parser.error("either a binary or --corpus is required")
+    if args.no_cache:
+        args.cache_dir = None
+    return args
+
+
+def expand_corpus(paths, stdin=sys.stdin):
+    """
+    Directories are scanned recursively, glob patterns are expanded and '-' reads one path per line from stdin.
+    Every file is returned once, in the order given.
+    """
+    files = {}
+    for path in paths:
+        if path == "-":
+            candidates = [line.strip() for line in stdin if line.strip()]
+        elif glob.has_magic(path):
+            candidates = sorted(glob.glob(path, recursive=True))
+        elif os.path.isdir(path):
+            candidates = sorted(str(p) for p in pathlib.Path(path).rglob("*"))
+        else:
+            candidates = [path]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                files.setdefault(candidate, None)
+            elif not os.path.isdir(candidate):
+                print(f"{candidate}: no such file, skipped", file=sys.stderr)
+    return list(files)
+
+
+def output_file_names(paths):
+    """
+    <binary name>.json for every binary. Binaries sharing their name with another one of the corpus, e.g. from
+    different directories, get a short hash of their full path appended: libc.so.6-1a2b3c4d.json
+    """
+    counts = Counter(pathlib.Path(path).name for path in paths)
+    names = {}
+    for path in paths:
+        name = pathlib.Path(path).name
+        if counts[name] > 1:
+            name = f"{name}-{hashlib.sha256(str(pathlib.Path(path).resolve()).encode()).hexdigest()[:8]}"
+        names[path] = f"{name}.json"
+    return names
+
+
+# the warm matcher of a corpus worker, loaded once per worker process
+_worker_matcher = None
+
+
+def _init_worker(cache_dir, backend, opcode_prefilter):
+    global _worker_matcher
+    ic.disable()
+    _worker_matcher = Matcher(cache_dir, backend, opcode_prefilter)
+
+
+def _scan_binary(path):
+    try:
+        return path, _worker_matcher.find_idioms_in_file(path), None
+    except Exception as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
+def scan_corpus(paths, output_dir=None, jobs=None, cache_dir=DISASSEMBLY_CACHE_DIR, backend="smda",
+                opcode_prefilter=False):
+    """
+    Scans the binaries with a pool of long-lived workers, each holding one matcher.
+    The results of every binary are written as soon as it is done, i.e. not in the given order.
+    The patterns and magic tables are loaded before the pool starts, forked workers share them with the parent.
+    There are at most as many workers as binaries.
+    The result files are named by output_file_names.
+    """
+    if output_dir:
+        pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+        output_names = output_file_names(paths)
+    preload(IDIOMS)
+    failed = 0
+    # forked workers inherit the preloaded data, spawned ones (where fork is not available) load it again
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    processes = max(1, min(jobs or os.cpu_count(), len(paths)))
+    with context.Pool(processes, initializer=_init_worker, initargs=(cache_dir, backend, opcode_prefilter)) as pool:
+        for path, matches, error in pool.imap_unordered(_scan_binary, paths):
+            if error:
+                failed += 1
+                print(f"{path}: failed ({error})", file=sys.stderr)
+                continue
+            if output_dir:
+                print(f"{path}: {len(matches)} matches -> {output_names[path]}")
+                write_file_for_decompiler(pathlib.Path(output_dir) / output_names[path], matches)
+            else:
+                print(f"{path}: {len(matches)} matches")
+                print_matches(matches)
+            sys.stdout.flush()
+    return failed
+
+
+def main():
+    args = parse_args()
+    if args.corpus:
+        return 1 if scan_corpus(expand_corpus(args.corpus), args.output_dir, args.jobs, args.cache_dir,
+                                  args.backend, args.opcode_prefilter) else 0
+
+    matcher = Matcher(args.cache_dir, args.backend, args.opcode_prefilter)
+    filename = args.output
+    if args.stream:
+        stream_matches(matcher.iter_idioms_in_file(args.binary, jobs=args.jobs or 1), filename)
+        if args.operand_cache_stats:
+            print(operand_cache_info(), file=sys.stderr)
+        return
+    matches = matcher.find_idioms_in_file(args.binary, jobs=args.jobs or 1)
+    if args.operand_cache_stats:
+        print(operand_cache_info(), file=sys.stderr)
+    print_matches(matches)
     constants = {x.constant for x in matches if x.constant}
     # expected = set(range(2, 100))# - {76}
     # ic(expected - constants)
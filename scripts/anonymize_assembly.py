@@ -6,32 +6,11 @@ import re
 from pathlib import Path
 from itertools import count
 
+from compiler_idioms.registers import INTELx64_REGISTERS, iter_registers
+
+# kept for the scripts importing it from here
+REGISTERS = INTELx64_REGISTERS
 
-REGISTERS = [
-    # Registers:
-    "al", "bl", "cl", "dl",
-    "ah", "bh", "ch", "dh",
-    "ax", "bx", "cx", "dx", "sp", "bp", "si", "di",
-    "eax", "ebx", "ecx", "edx", "esp", "ebp", "esi", "edi",
-    # 64bit Registers
-    "rax", "rbx", "rcx", "rdx", "rsp", "rbp", "rsi", "rdi", "rip",
-    "r8", "r9", "r10", "r11", "r12", "r13", "r14", "r15",
-    "r8d", "r9d", "r10d", "r11d", "r12d", "r13d", "r14d", "r15d",
-    "r8w", "r9w", "r10w", "r11w", "r12w", "r13w", "r14w", "r15w",
-    "r8b", "r9b", "r10b", "r11b", "r12b", "r13b", "r14b", "r15b",
-    "sil", "dil", "bpl", "spl",
-    # Segment Registers
-    "cs", "ds", "es", "fs", "gs", "ss",
-    # Extended Registers
-    "xmm0", "xmm1", "xmm2", "xmm3", "xmm4", "xmm5", "xmm6", "xmm7", "xmm8", "xmm9", "xmm10", "xmm11", "xmm12", "xmm13", "xmm14", "xmm15",
-    "ymm0", "ymm1", "ymm2", "ymm3", "ymm4", "ymm5", "ymm6", "ymm7", "ymm8", "ymm9", "ymm10", "ymm11", "ymm12", "ymm13", "ymm14", "ymm15",
-    # Debug Registers
-    "dr0", "dr1", "dr2", "dr3", "dr4", "dr5", "dr6", "dr7",
-    # Control Registers
-    "cr0", "cr1", "cr2", "cr3", "cr4", "cr5", "cr6", "cr7", "cr8",
-    # Test Registers
-    "tr3", "tr4", "tr5", "tr6", "tr7"
-]
 
 def anonymize():
     for idiom in os.listdir("data"):
@@ -57,7 +36,7 @@ def anonymize():
 def anonymize_data(data):
     # mask dword stuff
     dword_regex = r"(?P<loc>DWORD PTR\s*(\_[a-zA-Z]+\$)?\s*\[[^\]]*\])"
-    dword_regex = r'(?P<loc>((d*q*word|byte|(D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\]))'
+    dword_regex = r'(?P<loc>((d*q*word|byte|(Q?D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\]))'
     data["locations"] = {}
     dword_replacements = dword_names()
     for i, l in enumerate(data["text"]):
@@ -77,12 +56,12 @@ def anonymize_data(data):
         if const not in data["constants"].values():
             data["constants"][next(const_replacements)] = const
     # mask registers
-    register_replacements = get_replacement_dict(REGISTERS, register_names(), data)
+    register_replacements = get_replacement_dict(register_names(), data)
     data["registers"] = {v: k for k, v in register_replacements.items()}
     # remove duplicate whitespaces
     def repl_dword(text):
         if text.startswith("lea"):
-            return text.replace("DWORD PTR", "")
+            return re.sub("Q?DWORD PTR", "", text)
         return text
     data["text"] = [
         re.sub(' +', ' ', repl_dword(l)) for l in data["text"]
@@ -94,14 +73,14 @@ def anonymize_data(data):
     replace_in_data({v:k for k,v in {**data["constants"], **data["registers"], "shl": "sal"}.items()}, data)
 
 
-def get_replacement_dict(candidates, replacements, data):
+def get_replacement_dict(replacements, data):
+    """registers in order of their first occurrence, only whole words (r8d, but not r8 in r8d or fs in offset)"""
     #complete_text = "\n".join(data["text"])
     complete_text = "\n".join((" ".join(line.split(" ")[1:]) for line in data["text"]))
     result = {}
-    for match in re.finditer(f"({'|'.join(candidates)})", complete_text):
-        register = complete_text[match.span()[0]: match.span()[1]]
-        if register not in result:
-            result[register] = next(replacements)
+    for _, register in iter_registers(complete_text):
+        if register.name not in result:
+            result[register.name] = next(replacements)
     return result
 
 
@@ -114,7 +93,7 @@ def replace_in_data(replacement_dict, data):
     ]
     for instr in data["parsed"]:
         instr["operands"] = [re.sub(search_regex, get_replacement, str(o)) for o in instr["operands"]]
-        instr["operands"] = [o.replace("DWORD PTR", "").strip() for o in instr["operands"]]
+        instr["operands"] = [re.sub("Q?DWORD PTR", "", o).strip() for o in instr["operands"]]
         instr["text"] = re.sub(search_regex, get_replacement, instr["text"])
         instr["opcode"] = re.sub(search_regex, get_replacement, instr["opcode"])
 
@@ -108,6 +108,9 @@ def main():
     write_all_optimizations_pro_operation('divu', divu)
     write_all_optimizations_pro_operation('mods', mods)
     write_all_optimizations_pro_operation('modu', modu)
+    # long long operations, x64 only
+    for operation in ('divs64', 'divu64', 'mods64', 'modu64'):
+        write_all_optimizations_pro_operation(operation, DATA_DIR / operation / 'clusters')
 
 
 if __name__ == '__main__':
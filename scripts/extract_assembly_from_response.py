@@ -105,11 +105,11 @@ def _parse_asm_key(data: Dict, operation=None) -> Dict:
     # we store original assembly snippet of the pattern in case any mistake happens during parsing
 
     # we delete the first instruction if if is a mov reg, loc
-    if len(parsed_asm_lines) > 1 and parsed_asm_lines[0]["opcode"] == "mov" and re.match(f"({'|'.join(sorted(REGISTERS, key=len))}), (?P<loc>((d*q*word|byte|(D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\]))", ", ".join(map(str, parsed_asm_lines[0]["operands"]))):
+    if len(parsed_asm_lines) > 1 and parsed_asm_lines[0]["opcode"] == "mov" and re.match(f"({'|'.join(sorted(REGISTERS, key=len))}), (?P<loc>((d*q*word|byte|(Q?D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\]))", ", ".join(map(str, parsed_asm_lines[0]["operands"]))):
         parsed_asm_lines = parsed_asm_lines[1:]
         asm_text = asm_text[1:]
     # we also delete the last instruction if it is a mov loc, reg
-    if len(parsed_asm_lines) > 1 and parsed_asm_lines[-1]["opcode"] == "mov" and re.match(f"(?P<loc>((d*q*word|byte|(D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\])), ({'|'.join(sorted(REGISTERS, key=len))})", ", ".join(map(str, parsed_asm_lines[-1]["operands"]))):
+    if len(parsed_asm_lines) > 1 and parsed_asm_lines[-1]["opcode"] == "mov" and re.match(f"(?P<loc>((d*q*word|byte|(Q?D*WORD)|BYTE)+\s(ptr|PTR)\s*(\_?[a-zA-Z]+\$)?\s*\[(esp|ebp|rsp|rbp)+\s*(-|\+)*\s*([0-9]|0x[A-Fa-f0-9]+)*\])), ({'|'.join(sorted(REGISTERS, key=len))})", ", ".join(map(str, parsed_asm_lines[-1]["operands"]))):
         parsed_asm_lines = parsed_asm_lines[:-1]
         asm_text = asm_text[:-1]
     return {"parsed": parsed_asm_lines, "text": asm_text}
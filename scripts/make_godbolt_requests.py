@@ -45,6 +45,8 @@ GODBOLT_COMPILERS = [
 
 ]
 GODBOLT_SETTINGS = ["O0", "O1", "O2", "O3", "Os"]
+# idioms of long long operations, e.g. divs64, are only compiled for x64
+WIDE_IDIOM_SUFFIX = "64"
 
 
 def get_godbolt_responses(ignore_existing_responses=False):
@@ -59,7 +61,7 @@ def get_godbolt_responses(ignore_existing_responses=False):
             template = templatefile.read()
         print(f"Making requests for Idiom: {idiom}")
         values = set(sample_values(min_num=int(meta["MIN_VAL"]), max_num=int(meta["MAX_VAL"])))
-        if idiom.endswith("u"): values = values | set(range(1,2049))
+        if idiom.rstrip("0123456789").endswith("u"): values = values | set(range(1,2049))
         with multiprocessing.Pool(processes=8) as pool:
             results = list(tqdm.tqdm(pool.istarmap(handle_value, [(v, template, ignore_existing_responses, idiom) for v in values]), total=len(values)))
 
@@ -99,6 +101,8 @@ def sample_values(min_num, max_num):
 
 def make_godbolt_requests(c_code, ignore_existing_responses, value, idiom):
     for compiler in GODBOLT_COMPILERS:
+        if idiom.endswith(WIDE_IDIOM_SUFFIX) and ("-x86" in compiler or compiler.endswith("_32")):
+            continue
         request_compiler = compiler
         m32 = False
         if "-" in compiler:
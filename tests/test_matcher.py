@@ -0,0 +1,16 @@
+from compiler_idioms.matcher import Matcher
+
+# x / 7 (x86-64, gcc -O2): mov eax, edi; imul rax, rax, 0x24924925; shr rax, 0x20; sub edi, eax; shr edi, 1;
+# add eax, edi; shr eax, 2; ret
+DIVU_7 = bytes.fromhex("89f8" "4869c025499224" "48c1e820" "29c7" "d1ef" "01f8" "c1e802" "c3")
+
+
+def test_parallel_without_functions_is_empty():
+    matcher = Matcher(None, "linear")
+    assert matcher.find_idioms_in_file(buffer=(b"\x00" * 64, 0x1000, 64), jobs=4) == []
+
+
+def test_parallel_single_function_equals_serial():
+    serial = Matcher(None, "linear").find_idioms_in_file(buffer=(DIVU_7, 0x1000, 64))
+    parallel = Matcher(None, "linear").find_idioms_in_file(buffer=(DIVU_7, 0x1000, 64), jobs=4)
+    assert [str(match) for match in parallel] == [str(match) for match in serial]